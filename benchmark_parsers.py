@@ -0,0 +1,97 @@
+import argparse
+import glob
+import os
+import time
+import tracemalloc
+from typing import Callable, List, Optional
+
+import pandas as pd
+from bs4 import BeautifulSoup
+
+from html_utils import SELECTOLAX, available_html_parsers
+from http_cache import HTTP_CACHE_PATH
+from table_extraction import HTMLParser, extract_table
+
+
+def load_pages(pages_path: str) -> List[str]:
+    """
+    Loads recorded pages, either *.html files or bodies of the HTTP cache.
+    :param pages_path: Directory with the pages
+    """
+    paths = sorted(glob.glob(os.path.join(pages_path, "*.html")) + glob.glob(os.path.join(pages_path, "*.body")))
+    pages = list()
+    for path in paths:
+        with open(path, "rb") as file:
+            content = file.read()
+        if b"<table" in content:
+            pages.append(content.decode("utf-8", errors="replace"))
+    return pages
+
+
+def measure(func: Callable[[str], object], pages: List[str], repeat: int) -> tuple:
+    """
+    :return: Mean time per page (in ms) and peak traced memory (in MB) of parsing a single page
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for page in pages:
+            func(page)
+    mean_time = (time.perf_counter() - start) / (repeat * len(pages)) * 1000
+
+    peak = 0
+    for page in pages:
+        tracemalloc.start()
+        func(page)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    return mean_time, peak / 1024 ** 2
+
+
+def full_parse(parser: str) -> Callable[[str], object]:
+    if parser == SELECTOLAX:
+        return lambda html: HTMLParser(html)
+    return lambda html: BeautifulSoup(html, parser)
+
+
+def benchmark(pages: List[str], marker: Optional[str] = None, repeat: int = 3) -> pd.DataFrame:
+    """
+    Compares parse time and peak memory of the available parser backends.
+    Peak memory is traced by tracemalloc, so memory allocated by C extensions (lxml, selectolax) is not included.
+    :param pages: HTML of the pages
+    :param marker: If given, extraction of the table marked with it is measured too
+    :param repeat: Number of passes over the pages used for timing
+    """
+    results = list()
+    for parser in available_html_parsers():
+        row = {"parser": parser}
+        row["parse_ms"], row["parse_peak_mb"] = measure(full_parse(parser), pages, repeat)
+        if marker:
+            def extract(html: str):
+                try:
+                    extract_table(html, marker, parser=parser)
+                except RuntimeError:
+                    pass
+
+            row["extract_ms"], row["extract_peak_mb"] = measure(extract, pages, repeat)
+        results.append(row)
+
+    return pd.DataFrame(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark HTML parser backends on recorded pages")
+    parser.add_argument("-p", "--pages", type=str, default=HTTP_CACHE_PATH,
+                        help="Directory with recorded pages (*.html or HTTP cache *.body files)")
+    parser.add_argument("-m", "--marker", type=str, default=None,
+                        help="Marker of the table to extract, e.g. 'Kalendarium dywidend'")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="Number of timed passes over the pages")
+
+    args = parser.parse_args()
+
+    pages = load_pages(args.pages)
+    if not pages:
+        raise RuntimeError(f"No pages with tables found in {args.pages}")
+
+    print(f"Benchmark on {len(pages)} pages")
+    print(benchmark(pages, args.marker, args.repeat).to_string(index=False, float_format="%.2f"))
@@ -0,0 +1,164 @@
+import argparse
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+from cash_flows import anti_inflation_rates, rate_path_schedule
+from compare_bonds import BONDS_PATH, BondDefinition, load_bond_definitions
+
+MONTHS_PER_YEAR = 12
+
+
+def unit_value_curve(bond: BondDefinition, inflation: float, months: int, rollover: bool = True,
+                     cash_rate: float = 0.0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Value of one unit invested in the bond by the number of months since purchase.
+    Interest accrues linearly within a year. At maturity the proceeds are either rolled over into the same series or
+    kept as cash earning cash_rate.
+
+    Parameters:
+    - bond: Definition of the bond series.
+    - inflation: Assumed yearly inflation (a constant, so all tranches share the curve).
+    - months: Number of months of the curve.
+    - rollover: If True, matured proceeds are reinvested into the same series.
+    - cash_rate: Yearly rate earned by matured proceeds which are not rolled over.
+
+    Returns:
+    - Gross values by age in months, shape (months,).
+    - Values after the early redemption fee, i.e. what redeeming at that age would pay out.
+    """
+    cycle_months = bond.maturity * MONTHS_PER_YEAR
+    rates = anti_inflation_rates(bond.first_year_rate, bond.margin, inflation if bond.indexed else 0.0,
+                                 bond.maturity)
+    totals, _ = rate_path_schedule(1.0, rates, bond.n, bond.capitalized)
+
+    cycle_ages = np.arange(cycle_months + 1)
+    cycle = np.interp(cycle_ages / MONTHS_PER_YEAR, np.arange(bond.maturity + 1), np.concatenate([[1.0], totals]))
+    cycle_fee = np.where(cycle_ages < cycle_months,
+                         np.minimum(bond.early_redemption_fee, np.maximum(cycle - 1, 0)), 0.0)
+
+    ages = np.arange(months)
+    if rollover:
+        cycles, age_in_cycle = np.divmod(ages, cycle_months)
+        growth = cycle[-1] ** cycles
+        return growth * cycle[age_in_cycle], growth * (cycle[age_in_cycle] - cycle_fee[age_in_cycle])
+
+    held = np.minimum(ages, cycle_months)
+    cash_growth = (1 + cash_rate) ** (np.maximum(ages - cycle_months, 0) / MONTHS_PER_YEAR)
+    gross = cycle[held] * cash_growth
+    return gross, gross - cycle_fee[held]
+
+
+@dataclass
+class LadderResult:
+    names: List[str]
+    contributions: np.ndarray
+    values: np.ndarray
+    liquidation_values: np.ndarray
+
+    def to_frame(self) -> pd.DataFrame:
+        df = pd.DataFrame(self.values.T, columns=self.names)
+        df.insert(0, "contributed", self.contributions.sum(axis=0).cumsum())
+        df["total"] = self.values.sum(axis=0)
+        df["liquidation_value"] = self.liquidation_values.sum(axis=0)
+        df.index = pd.RangeIndex(1, len(df) + 1, name="month")
+        return df
+
+
+def simulate_ladder(bonds: List[BondDefinition], contributions: np.ndarray, inflation: float,
+                    rollover: bool = True, cash_rate: float = 0.0) -> LadderResult:
+    """
+    Simulates recurring purchases of bonds. Every monthly purchase is a tranche valued by the unit curve of its series
+    at its age, all tranches of all series are evaluated as one array operation.
+
+    Parameters:
+    - bonds: Definitions of the purchased series.
+    - contributions: Amounts bought every month, shape (series, months).
+    - inflation: Assumed yearly inflation.
+    - rollover: See unit_value_curve.
+    - cash_rate: See unit_value_curve.
+
+    Returns:
+    - Portfolio values by series and month (at the end of the month, after its purchase).
+    """
+    contributions = np.asarray(contributions, dtype=np.float64)
+    months = contributions.shape[1]
+    curves = [unit_value_curve(bond, inflation, months, rollover, cash_rate) for bond in bonds]
+    gross = np.stack([curve[0] for curve in curves])
+    net = np.stack([curve[1] for curve in curves])
+
+    # ages of tranches (purchase month x month), negative before the purchase
+    ages = np.arange(months)[None, :] - np.arange(months)[:, None]
+    bought = ages >= 0
+    safe_ages = np.where(bought, ages, 0)
+
+    values = np.einsum("sp,spm->sm", contributions, np.where(bought, gross[:, safe_ages], 0.0))
+    liquidation_values = np.einsum("sp,spm->sm", contributions, np.where(bought, net[:, safe_ages], 0.0))
+    return LadderResult([bond.name for bond in bonds], contributions, values, liquidation_values)
+
+
+def monthly_contributions(monthly: float, weights: List[float], years: int) -> np.ndarray:
+    weights = np.asarray(weights, dtype=np.float64)
+    return np.repeat((monthly * weights / weights.sum())[:, None], years * MONTHS_PER_YEAR, axis=1)
+
+
+def draw_ladder(df: pd.DataFrame, names: List[str], save_path: Optional[str] = None):
+    years = df.index / MONTHS_PER_YEAR
+    plt.stackplot(years, *[df[name] for name in names], labels=names, alpha=0.7)
+    plt.plot(years, df["contributed"], color="black", label="contributed")
+    plt.plot(years, df["liquidation_value"], color="red", linestyle="--", label="liquidation value")
+    plt.xlabel('Years')
+    plt.ylabel('Amount')
+    plt.title('Bond ladder value')
+    plt.grid()
+    plt.legend(loc="upper left")
+    if save_path:
+        plt.savefig(save_path)
+        print(f"Saved plot to {save_path}")
+    else:
+        plt.show()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate monthly purchases of retail bonds.")
+    parser.add_argument("-b", "--bonds", type=str, default=BONDS_PATH, help="JSON file with bond definitions")
+    parser.add_argument("-s", "--series", type=str, nargs="+", required=True, help="Names of the purchased series")
+    parser.add_argument("-w", "--weights", type=float, nargs="+", default=None,
+                        help="Shares of the monthly amount per series, equal by default")
+    parser.add_argument("-m", "--monthly", type=float, required=True, help="Amount invested every month")
+    parser.add_argument("-t", "--years", type=int, required=True, help="Number of years of purchases")
+    parser.add_argument("-i", "--assumed-inflation", type=float, required=True, help="Assumed inflation rate (as a decimal)")
+    parser.add_argument("--no-rollover", action="store_true", help="Keep matured proceeds as cash")
+    parser.add_argument("--cash-rate", type=float, default=0.0, help="Yearly rate of cash kept after maturity")
+    parser.add_argument("-o", "--output", type=str, default=None, help="CSV file for the monthly values")
+    parser.add_argument("--plot", type=str, default=None, help="Save the plot to this file instead of showing it")
+    parser.add_argument("--no-plot", action="store_true", help="Do not draw the plot")
+
+    args = parser.parse_args()
+
+    definitions = {bond.name: bond for bond in load_bond_definitions(args.bonds)}
+    unknown = [name for name in args.series if name not in definitions]
+    if unknown:
+        raise ValueError(f"Unknown series {unknown} in {args.bonds}")
+    bonds = [definitions[name] for name in args.series]
+
+    weights = args.weights or [1.0] * len(bonds)
+    if len(weights) != len(bonds):
+        raise ValueError("Number of weights has to match the number of series")
+
+    start = time.perf_counter()
+    result = simulate_ladder(bonds, monthly_contributions(args.monthly, weights, args.years), args.assumed_inflation,
+                             not args.no_rollover, args.cash_rate)
+    df = result.to_frame()
+    print(f"Simulated in {(time.perf_counter() - start) * 1000:.1f}ms")
+    print(df.iloc[MONTHS_PER_YEAR - 1::MONTHS_PER_YEAR].to_string(float_format="%.2f"))
+
+    if args.output:
+        df.to_csv(args.output)
+        print(f"Saved monthly values to {args.output}")
+    if not args.no_plot:
+        draw_ladder(df, result.names, args.plot)
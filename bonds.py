@@ -2,7 +2,7 @@ import numpy as np
 from typing import Tuple, List
 
 
-from utils import calculate_compound_interest_yearly, calculate_compound_interest
+from cash_flows import anti_inflation_rates, rate_path_schedule
 
 
 
@@ -25,27 +25,35 @@ def anti_inflation_bond(principal: float, first_year_rate: float, coupon: float,
     - The compound interest earned per year
     """
 
-    total_amounts, compound_interests = [], []
+    total_amounts, compound_interests = anti_inflation_bond_schedule(principal, first_year_rate, coupon,
+                                                                     assumed_inflation, time, n, penalty)
+    return total_amounts.tolist(), compound_interests.tolist()
 
-    # first year
-    total_amount, compound_interest = calculate_compound_interest(principal, first_year_rate, 1, n)
 
-    total_amounts.append(total_amount)
-    compound_interests.append(compound_interest)
-
-    if time > 1:
-        #following years
-        following_total_amounts, following_compound_interests = calculate_compound_interest_yearly(total_amount,
-                                                                                      coupon + assumed_inflation,
-                                                                                                   time - 1, n)
+def anti_inflation_bond_schedule(principal, first_year_rate, coupon, assumed_inflation, time: float, n=1,
+                                 penalty=0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Calculate yearly schedules of many inflation indexed bonds at once, see anti_inflation_bond.
 
-        following_compound_interests = np.array(following_compound_interests) + compound_interest
+    Parameters:
+    - principal: The initial amounts of money (arrays or scalars, broadcast together with the rates).
+    - first_year_rate: The interest rates for the first year.
+    - coupon: The coupon rates (margins over inflation) for following years.
+    - assumed_inflation: Inflation for following years, see cash_flows.anti_inflation_rates (may be paths).
+    - time: The time the money is invested for (in years, at least one year is calculated).
+    - n: The numbers of times interest is compounded per year.
+    - penalty: The penalties for early withdrawal, subtracted in the last year.
 
-        total_amounts.extend(following_total_amounts)
-        compound_interests.extend(following_compound_interests.tolist())
+    Returns:
+    - The total amounts after interest per year, shape (..., years)
+    - The compound interests earned per year, same shape
+    """
+    years = max(int(time), 1)
+    rates = anti_inflation_rates(first_year_rate, coupon, assumed_inflation, years)
+    total_amounts, compound_interests = rate_path_schedule(principal, rates, n)
 
-    if penalty:
-        total_amounts[-1] -= penalty
-        compound_interests[-1] -= penalty
+    penalty = np.asarray(penalty, dtype=np.float64)
+    total_amounts[..., -1] -= penalty
+    compound_interests[..., -1] -= penalty
 
-    return total_amounts, compound_interests
\ No newline at end of file
+    return total_amounts, compound_interests
@@ -0,0 +1,78 @@
+from typing import Tuple
+
+import numpy as np
+
+
+def compound_schedule(principal, rate, time, n=1, periods_per_year: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Calculate compound interest schedules for arrays of investments at once.
+
+    Parameters:
+    - principal: The initial amounts of money (arrays or scalars, broadcast together with rate, time and n).
+    - rate: The annual interest rates (as decimals, e.g., 0.05 for 5%).
+    - time: The times the money is invested for (in years).
+    - n: The numbers of times interest is compounded per year.
+    - periods_per_year: Number of schedule points per year (1 for yearly schedules).
+
+    Returns:
+    - The total amounts at the end of every period, shape (*broadcast shape, periods), NaN after the horizon.
+    - The compound interest earned until the end of every period, same shape.
+    """
+    principal, rate, time, n = np.broadcast_arrays(*[np.asarray(value, dtype=np.float64)
+                                                     for value in (principal, rate, time, n)])
+    steps = np.floor(time * periods_per_year + 1e-9).astype(np.int64)
+    if steps.size and steps.min() < 1:
+        raise ValueError("Time must cover at least one period.")
+
+    elapsed = np.arange(1, steps.max() + 1) / periods_per_year
+    total_amounts = principal[..., None] * (1 + rate[..., None] / n[..., None]) ** (n[..., None] * elapsed)
+    total_amounts = np.where(np.arange(1, steps.max() + 1) <= steps[..., None], total_amounts, np.nan)
+    return total_amounts, total_amounts - principal[..., None]
+
+
+def rate_path_schedule(principal, yearly_rates, n=1, capitalized=True) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Calculate yearly schedules of investments whose interest rate changes every year, e.g. inflation indexed bonds.
+
+    Parameters:
+    - principal: The initial amounts of money, broadcast against the leading axes of yearly_rates.
+    - yearly_rates: The annual interest rates of the consecutive years, shape (..., years).
+    - n: The numbers of times interest is compounded per year, broadcast like principal.
+    - capitalized: If False, the yearly interest is paid out instead of being added to the principal (the totals
+      include the interest paid so far), broadcast like principal.
+
+    Returns:
+    - The total amounts at the end of every year, shape (..., years).
+    - The compound interest earned until the end of every year, same shape.
+    """
+    yearly_rates = np.asarray(yearly_rates, dtype=np.float64)
+    principal = np.asarray(principal, dtype=np.float64)[..., None]
+    n = np.asarray(n, dtype=np.float64)[..., None]
+    capitalized = np.asarray(capitalized, dtype=bool)[..., None]
+
+    yearly_growth = (1 + yearly_rates / n) ** n
+    total_amounts = principal * np.where(capitalized, np.cumprod(yearly_growth, axis=-1),
+                                         1 + np.cumsum(yearly_growth - 1, axis=-1))
+    return total_amounts, total_amounts - principal
+
+
+def anti_inflation_rates(first_year_rate, coupon, inflation, years: int) -> np.ndarray:
+    """
+    Builds yearly rates of inflation indexed bonds: the first year rate, then coupon (margin) + inflation.
+
+    Parameters:
+    - first_year_rate: The interest rates for the first year (arrays or scalars).
+    - coupon: The margins over inflation for following years.
+    - inflation: Inflation rates for following years, broadcast against shape (..., years - 1): a scalar, paths of
+      shape (..., years - 1) or one constant per bond with a trailing axis of length 1.
+    - years: Number of years.
+
+    Returns:
+    - Yearly rates of shape (..., years).
+    """
+    first_year_rate = np.asarray(first_year_rate, dtype=np.float64)[..., None]
+    following = np.asarray(coupon, dtype=np.float64)[..., None] + np.asarray(inflation, dtype=np.float64)
+
+    shape = np.broadcast_shapes(first_year_rate.shape[:-1], following.shape[:-1])
+    return np.concatenate([np.broadcast_to(first_year_rate, shape + (1,)),
+                           np.broadcast_to(following, shape + (years - 1,))], axis=-1)
@@ -1,64 +1,176 @@
 import argparse
-import matplotlib.pyplot as plt
-
-from bonds import anti_inflation_bond
+import json
+import os
+from dataclasses import dataclass
+from typing import List, Optional
 
-# def draw_graph(
-def draw_graph_total_amount(total_amounts1: list, total_amounts2: list):
-    print(total_amounts1[-1], total_amounts2[-1])
-
-    years = list(range(1, len(total_amounts1) + 1))
-    plt.plot(years, total_amounts1, label='Total Amounts (Bond 1)')
-    plt.plot(years, total_amounts2, label='Total Amounts (Bond 2)')
-    plt.xlabel('Years')
-    plt.ylabel('Amount')
-    plt.title('Total Amounts and Compound Interests Over Time')
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+from cash_flows import anti_inflation_rates, rate_path_schedule
+
+BONDS_PATH = os.path.join("data", "bonds", "retail_bonds.json")
+
+
+@dataclass
+class BondDefinition:
+    """
+    Retail bond series.
+
+    Parameters:
+    - name: Name of the series.
+    - first_year_rate: The interest rate for the first year (as a decimal).
+    - margin: The rate for following years, added to inflation for indexed bonds (as a decimal).
+    - maturity: Years to maturity.
+    - indexed: If True, inflation is added to the margin in following years.
+    - capitalized: If True, interest is added to the principal, otherwise it is paid out every year.
+    - early_redemption_fee: Fee for redemption before maturity as a fraction of the principal, limited to the
+      interest earned.
+    - n: The number of times interest is compounded per year.
+    """
+    name: str
+    first_year_rate: float
+    margin: float
+    maturity: int
+    indexed: bool = True
+    capitalized: bool = True
+    early_redemption_fee: float = 0.0
+    n: int = 1
+
+
+def load_bond_definitions(path: str = BONDS_PATH) -> List[BondDefinition]:
+    with open(path, "r") as file:
+        return [BondDefinition(**definition) for definition in json.load(file)]
+
+
+@dataclass
+class RedemptionMatrix:
+    names: List[str]
+    years: np.ndarray
+    total_amounts: np.ndarray
+    penalties: np.ndarray
+    net_amounts: np.ndarray
+    principal: float
+
+    @property
+    def annualized_returns(self) -> np.ndarray:
+        return (self.net_amounts / self.principal) ** (1 / self.years) - 1
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.net_amounts, index=self.names, columns=self.years)
+
+    def ranking(self, year: int) -> pd.DataFrame:
+        """
+        Ranks bonds which can be held until the year (their maturity is not earlier) by the net amount.
+        """
+        if year not in self.years:
+            raise ValueError(f"Redemption year has to be between {self.years[0]} and {self.years[-1]}, got {year}.")
+        column = int(np.searchsorted(self.years, year))
+        df = pd.DataFrame({"bond": self.names, "net_amount": self.net_amounts[:, column],
+                           "penalty": self.penalties[:, column],
+                           "annualized_return": self.annualized_returns[:, column]})
+        df = df.dropna(subset=["net_amount"]).sort_values("net_amount", ascending=False).reset_index(drop=True)
+        df.index += 1
+        return df
+
+
+def redemption_matrix(bonds: List[BondDefinition], principal: float, inflation,
+                      horizon: Optional[int] = None) -> RedemptionMatrix:
+    """
+    Evaluates every bond for every redemption year in one computation.
+    Before maturity the early redemption fee is subtracted (limited to the interest earned), at maturity no fee is
+    paid. Years after the maturity of a bond are NaN.
+
+    Parameters:
+    - bonds: Definitions of the bonds.
+    - principal: The initial amount of money invested in every bond.
+    - inflation: Assumed yearly inflation, a constant or a path for years 2..horizon.
+    - horizon: Last redemption year, the longest maturity if None.
+
+    Returns:
+    - Matrices of total amounts, penalties and net amounts (bonds x redemption years).
+    """
+    horizon = horizon or max(bond.maturity for bond in bonds)
+    years = np.arange(1, horizon + 1)
+
+    maturity = np.array([bond.maturity for bond in bonds])[:, None]
+    indexed = np.array([bond.indexed for bond in bonds], dtype=np.float64)[:, None]
+    rates = anti_inflation_rates([bond.first_year_rate for bond in bonds], [bond.margin for bond in bonds],
+                                 indexed * np.asarray(inflation, dtype=np.float64), horizon)
+    total_amounts, interests = rate_path_schedule(principal, rates, [bond.n for bond in bonds],
+                                                  [bond.capitalized for bond in bonds])
+
+    fees = np.array([bond.early_redemption_fee for bond in bonds])[:, None] * principal
+    penalties = np.where(years < maturity, np.minimum(fees, np.maximum(interests, 0)), 0.0)
+
+    after_maturity = years > maturity
+    total_amounts[after_maturity] = np.nan
+    penalties[after_maturity] = np.nan
+    return RedemptionMatrix([bond.name for bond in bonds], years, total_amounts, penalties, total_amounts - penalties,
+                            principal)
+
+
+def draw_net_amounts(matrix: RedemptionMatrix, save_path: Optional[str] = None):
+    for name, net_amounts in zip(matrix.names, matrix.net_amounts):
+        plt.plot(matrix.years, net_amounts, marker="o", label=name)
+    plt.xlabel('Redemption year')
+    plt.ylabel('Amount after penalty')
+    plt.title('Net amounts by redemption year')
+    plt.grid()
     plt.legend()
-    plt.show()
+    _save_or_show(save_path)
 
 
+def draw_annualized_returns(matrix: RedemptionMatrix, save_path: Optional[str] = None):
+    fig, ax = plt.subplots(figsize=(max(6, len(matrix.years) * 0.6), max(3, len(matrix.names) * 0.6)))
+    image = ax.imshow(matrix.annualized_returns * 100, aspect="auto", cmap="viridis")
+    ax.set_xticks(range(len(matrix.years)), matrix.years)
+    ax.set_yticks(range(len(matrix.names)), matrix.names)
+    ax.set_xlabel('Redemption year')
+    ax.set_title('Annualized net return (%)')
+    fig.colorbar(image, ax=ax)
+    _save_or_show(save_path)
 
-def draw_graph_compound_interest(compound_interests1: list, compound_interests2: list):
-    print(compound_interests1[-1], compound_interests2[-1])
-
-    years = list(range(1, len(compound_interests1) + 1))
-    plt.plot( years, compound_interests1, label='Compound Interests (Bond 1)')
-    plt.plot( years, compound_interests2, label='Compound Interests (Bond 2)')
-    plt.xlabel('Years')
-    plt.ylabel('Amount')
-    plt.title('Total Amounts and Compound Interests Over Time')
-    plt.legend()
-    plt.show()
 
+def _save_or_show(save_path: Optional[str]):
+    plt.tight_layout()
+    if save_path:
+        plt.savefig(save_path)
+        print(f"Saved plot to {save_path}")
+    else:
+        plt.show()
+    plt.close()
 
 
 def main(args: argparse.Namespace):
-    # total_amounts, compound_interests = calculate_compound_interest_yearly(args.principal, args.rate, args.time, args.n)
+    bonds = load_bond_definitions(args.bonds)
+    matrix = redemption_matrix(bonds, args.principal, args.assumed_inflation, args.horizon)
 
-    # TODO: handle penalty properly depending on withdraw time and time to maturity of bond
-    total_amounts, compound_interests = anti_inflation_bond(args.principal, args.first_year_rate, args.coupon,
-                                                            args.assumed_inflation, args.time, args.n, penalty=3)
+    print("Net amounts by redemption year:")
+    print(matrix.to_frame().to_string(float_format="%.2f"))
 
-    total_amounts2, compound_interests2 = anti_inflation_bond(args.principal, args.first_year_rate - 0.003,
-                                                              args.coupon - 0.005,
-                                                            args.assumed_inflation, args.time, args.n, penalty=2)
+    # by default the last year every bond can still be held, later years leave out the shorter bonds
+    year = min(min(bond.maturity for bond in bonds), int(matrix.years[-1])) if args.year is None else args.year
+    print(f"Ranking for redemption after {year} years:")
+    print(matrix.ranking(year).to_string(float_format="%.4f"))
 
-    draw_graph_compound_interest(compound_interests, compound_interests2)
+    if not args.no_plot:
+        prefix = args.plot
+        draw_net_amounts(matrix, f"{prefix}_net_amounts.png" if prefix else None)
+        draw_annualized_returns(matrix, f"{prefix}_annualized_returns.png" if prefix else None)
 
-    print(f"Total Amounts: {total_amounts}")
-    print(f"Compound Interests: {compound_interests}")
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Calculate compound interest.")
-    parser.add_argument("-p", "--principal", type=float, required=True, help="Initial amount of money (P)")
-    parser.add_argument("-fyr", "--first-year-rate", type=float, required=True, help="First year interest rate (as a "
-                                                                                   "decimal)")
-    parser.add_argument("-c", "--coupon", type=float, required=True, help="Coupon rate (as a decimal)")
+    parser = argparse.ArgumentParser(description="Compare bonds for every redemption year.")
+    parser.add_argument("-b", "--bonds", type=str, default=BONDS_PATH, help="JSON file with bond definitions")
+    parser.add_argument("-p", "--principal", type=float, default=1000, help="Initial amount of money (P)")
     parser.add_argument("-i", "--assumed-inflation", type=float, required=True, help="Assumed inflation rate (as a decimal)")
-    parser.add_argument("-t", "--time", type=float, required=True, help="Time in years")
-    parser.add_argument("-n", "--n", type=int, default=1, help="Number of times interest is compounded per year")
+    parser.add_argument("-t", "--horizon", type=int, default=None, help="Last redemption year, longest maturity by default")
+    parser.add_argument("-y", "--year", type=int, default=None, help="Redemption year of the ranking, the shortest maturity (within the horizon) by default")
+    parser.add_argument("--plot", type=str, default=None, help="Prefix of saved plot files, plots are shown if not given")
+    parser.add_argument("--no-plot", action="store_true", help="Do not draw plots")
 
     args = parser.parse_args()
 
     main(args)
-
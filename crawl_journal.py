@@ -0,0 +1,162 @@
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+CRAWL_JOURNAL_PATH = os.path.join("data", "crawl_journal.sqlite")
+
+PENDING = "pending"
+IN_FLIGHT = "in_flight"
+DONE = "done"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    url TEXT,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (kind, key)
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS events (
+    run_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    state TEXT NOT NULL,
+    error TEXT,
+    at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (kind, state, next_attempt_at);
+CREATE INDEX IF NOT EXISTS events_run ON events (run_id);
+"""
+
+
+@dataclass
+class RunReport:
+    run_id: int
+    kind: str
+    done: int
+    failed: int
+    duration: float
+
+    @property
+    def throughput(self) -> float:
+        """
+        Number of finished jobs per minute.
+        """
+        return 60 * (self.done + self.failed) / self.duration if self.duration > 0 else 0.0
+
+    @property
+    def failure_rate(self) -> float:
+        finished = self.done + self.failed
+        return self.failed / finished if finished else 0.0
+
+    def __str__(self) -> str:
+        return (f"Run {self.run_id} ({self.kind}): {self.done} done, {self.failed} failed "
+                f"({self.failure_rate:.1%}), {self.throughput:.1f} jobs/min in {self.duration:.0f} s")
+
+
+class CrawlJournal:
+    """
+    Persistent journal of crawl jobs stored in SQLite.
+    Every job is identified by its kind (e.g. "results", "dividends") and key (e.g. company name) and goes through
+    the states pending -> in_flight -> done / failed. Failed jobs are retried with exponential backoff until
+    max_attempts is reached. Jobs left in flight by a killed process are returned to pending on start.
+    """
+
+    def __init__(self, path: str = CRAWL_JOURNAL_PATH, max_attempts: int = 5, base_backoff: float = 60.0):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._connection:
+            self._connection.executescript(SCHEMA)
+            self._connection.execute("UPDATE jobs SET state = ? WHERE state = ?", (PENDING, IN_FLIGHT))
+
+    def close(self):
+        self._connection.close()
+
+    def _execute(self, query: str, params: tuple = ()) -> list:
+        with self._lock, self._connection:
+            return self._connection.execute(query, params).fetchall()
+
+    def start_run(self, kind: str) -> int:
+        with self._lock, self._connection:
+            cursor = self._connection.execute("INSERT INTO runs (kind, started_at) VALUES (?, ?)",
+                                              (kind, time.time()))
+            return cursor.lastrowid
+
+    def finish_run(self, run_id: int) -> RunReport:
+        self._execute("UPDATE runs SET finished_at = ? WHERE id = ?", (time.time(), run_id))
+        return self.run_report(run_id)
+
+    def enqueue(self, kind: str, key: str, url: Optional[str] = None, state: str = PENDING):
+        """
+        Adds a job to the journal, existing jobs are left untouched.
+        """
+        self._execute("INSERT OR IGNORE INTO jobs (kind, key, url, state, updated_at) VALUES (?, ?, ?, ?, ?)",
+                      (kind, key, url, state, time.time()))
+
+    def pending(self, kind: str) -> List[str]:
+        """
+        Returns keys of jobs which are due to be run: pending ones and failed ones whose backoff has passed.
+        """
+        rows = self._execute("SELECT key FROM jobs WHERE kind = ? AND (state = ? OR (state = ? AND attempts < ?)) "
+                             "AND next_attempt_at <= ? ORDER BY key",
+                             (kind, PENDING, FAILED, self.max_attempts, time.time()))
+        return [row[0] for row in rows]
+
+    def _record(self, run_id: int, kind: str, key: str, state: str, error: Optional[str] = None):
+        self._execute("INSERT INTO events (run_id, kind, key, state, error, at) VALUES (?, ?, ?, ?, ?, ?)",
+                      (run_id, kind, key, state, error, time.time()))
+
+    def mark_in_flight(self, kind: str, key: str):
+        self._execute("UPDATE jobs SET state = ?, attempts = attempts + 1, updated_at = ? WHERE kind = ? AND key = ?",
+                      (IN_FLIGHT, time.time(), kind, key))
+
+    def mark_done(self, run_id: int, kind: str, key: str):
+        self._execute("UPDATE jobs SET state = ?, last_error = NULL, updated_at = ? WHERE kind = ? AND key = ?",
+                      (DONE, time.time(), kind, key))
+        self._record(run_id, kind, key, DONE)
+
+    def mark_failed(self, run_id: int, kind: str, key: str, reason: str):
+        now = time.time()
+        rows = self._execute("SELECT attempts FROM jobs WHERE kind = ? AND key = ?", (kind, key))
+        attempts = max(rows[0][0] if rows else 1, 1)
+        next_attempt_at = now + self.base_backoff * 2 ** (attempts - 1)
+        self._execute("UPDATE jobs SET state = ?, last_error = ?, next_attempt_at = ?, updated_at = ? "
+                      "WHERE kind = ? AND key = ?", (FAILED, reason, next_attempt_at, now, kind, key))
+        self._record(run_id, kind, key, FAILED, reason)
+
+    def failures(self, kind: str) -> List[tuple]:
+        """
+        Returns (key, attempts, last_error) of failed jobs.
+        """
+        return self._execute("SELECT key, attempts, last_error FROM jobs WHERE kind = ? AND state = ? ORDER BY key",
+                             (kind, FAILED))
+
+    def run_report(self, run_id: int) -> RunReport:
+        kind, started_at, finished_at = self._execute("SELECT kind, started_at, finished_at FROM runs WHERE id = ?",
+                                                      (run_id,))[0]
+        counts = dict(self._execute("SELECT state, COUNT(*) FROM events WHERE run_id = ? GROUP BY state",
+                                    (run_id,)))
+        duration = (finished_at or time.time()) - started_at
+        return RunReport(run_id=run_id, kind=kind, done=counts.get(DONE, 0), failed=counts.get(FAILED, 0),
+                         duration=duration)
@@ -0,0 +1,189 @@
+import asyncio
+import json
+import os
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+import pandas as pd
+
+from crawl_journal import DONE, PENDING, CrawlJournal, RunReport
+from dividend_tools import get_data_of_single_company, get_companies_results, get_financial_results_url
+from http_session import get_host
+
+
+@dataclass
+class CrawlJob:
+    """
+    Single unit of work of the crawler.
+
+    Parameters:
+    - key: Identifier of the job (e.g. company name).
+    - url: URL which is fetched by the job, used to group jobs by host.
+    - fetch: Blocking function returning the parsed DataFrame.
+    - kwargs: Keyword arguments passed to fetch.
+    """
+    key: str
+    url: str
+    fetch: Callable[..., pd.DataFrame]
+    kwargs: dict = field(default_factory=dict)
+
+    @property
+    def host(self) -> str:
+        return get_host(self.url)
+
+
+@dataclass
+class CrawlResult:
+    job: CrawlJob
+    df: Optional[pd.DataFrame] = None
+    error: Optional[Exception] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def dividend_jobs(company_links: Dict[str, str]) -> List[CrawlJob]:
+    """
+    Creates jobs fetching the dividend history of companies.
+    :param company_links: Mapping of company name to its stockwatch.pl dividends URL
+    """
+    return [CrawlJob(key=company, url=url, fetch=get_data_of_single_company, kwargs={"url": url,
+                                                                                   "ignore_save_errors": True})
+            for company, url in company_links.items()]
+
+
+def dividend_jobs_from_links_file(links_path: str) -> List[CrawlJob]:
+    with open(links_path, "r") as file:
+        company_links = json.load(file)
+    return dividend_jobs(company_links)
+
+
+def results_jobs(companies: List[str], save_results: bool = True) -> List[CrawlJob]:
+    """
+    Creates jobs fetching the financial results of companies from strefainwestorow.pl.
+    :param companies: Names of the companies
+    :param save_results: If True, results are saved by get_companies_results
+    """
+    jobs = list()
+    for company in companies:
+        try:
+            url = get_financial_results_url(company)
+        except ValueError as e:
+            print(f"Skipping {company}: {e}")
+            continue
+        jobs.append(CrawlJob(key=company, url=url, fetch=get_companies_results,
+                             kwargs={"company_name": company, "save_results": save_results}))
+    return jobs
+
+
+def companies_in_dir(path: str) -> List[str]:
+    return [os.path.splitext(name)[0] for name in sorted(os.listdir(path))]
+
+
+async def crawl(jobs: List[CrawlJob], max_per_host: int = 2, max_total: int = 8, host_delay: float = 0.0,
+                on_start: Optional[Callable[[CrawlJob], None]] = None) -> AsyncIterator[CrawlResult]:
+    """
+    Runs the jobs concurrently and yields the results as they complete.
+    Blocking fetch functions are executed in worker threads, the number of concurrent requests to a single host
+    is capped by max_per_host and consecutive requests to the same host are started at least host_delay seconds
+    apart. Request rates themselves are limited by the per-host token buckets of rate_limiter.
+    :param jobs: Jobs to run
+    :param max_per_host: Maximum number of concurrent requests to a single host
+    :param max_total: Maximum number of concurrent requests in total
+    :param host_delay: Minimal delay (in seconds) between starts of requests to the same host
+    :param on_start: Optional callback called right before a job is started
+    """
+    loop = asyncio.get_running_loop()
+    total_semaphore = asyncio.Semaphore(max_total)
+    host_semaphores: Dict[str, asyncio.Semaphore] = dict()
+    host_locks: Dict[str, asyncio.Lock] = dict()
+    host_last_start: Dict[str, float] = dict()
+
+    async def wait_for_host_slot(host: str):
+        async with host_locks.setdefault(host, asyncio.Lock()):
+            wait = host_last_start.get(host, -host_delay) + host_delay - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            host_last_start[host] = loop.time()
+
+    async def run(job: CrawlJob) -> CrawlResult:
+        host_semaphore = host_semaphores.setdefault(job.host, asyncio.Semaphore(max_per_host))
+        async with host_semaphore, total_semaphore:
+            await wait_for_host_slot(job.host)
+            if on_start is not None:
+                on_start(job)
+            try:
+                df = await asyncio.to_thread(job.fetch, **job.kwargs)
+                return CrawlResult(job=job, df=df)
+            except Exception as e:
+                return CrawlResult(job=job, error=e)
+
+    tasks = [asyncio.create_task(run(job)) for job in jobs]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def run_crawl(jobs: List[CrawlJob], on_result: Optional[Callable[[CrawlResult], None]] = None,
+              **crawl_kwargs) -> List[CrawlResult]:
+    """
+    Synchronous wrapper around crawl.
+    :param jobs: Jobs to run
+    :param on_result: Optional callback called for each result as soon as it completes
+    :return: List of results in order of completion
+    """
+    async def collect() -> List[CrawlResult]:
+        results = list()
+        async for result in crawl(jobs, **crawl_kwargs):
+            if on_result is not None:
+                on_result(result)
+            results.append(result)
+        return results
+
+    return asyncio.run(collect())
+
+
+def run_journaled_crawl(journal: CrawlJournal, kind: str, jobs: List[CrawlJob],
+                        on_result: Optional[Callable[[CrawlResult], None]] = None,
+                        is_done: Optional[Callable[[CrawlJob], bool]] = None, **crawl_kwargs) -> RunReport:
+    """
+    Runs the jobs which are due according to the journal and records their state in it, so an interrupted crawl
+    can be resumed and failed jobs are retried with backoff in following runs.
+    :param journal: Journal of the crawl
+    :param kind: Kind of the jobs in the journal
+    :param jobs: All jobs of the crawl
+    :param on_result: Optional callback called for each result as soon as it completes, exceptions raised in it
+    mark the job as failed
+    :param is_done: Optional predicate marking jobs as done when they are added to the journal for the first time
+    :return: Report of the run
+    """
+    for job in jobs:
+        state = DONE if is_done is not None and is_done(job) else PENDING
+        journal.enqueue(kind, job.key, job.url, state=state)
+
+    due = set(journal.pending(kind))
+    jobs = [job for job in jobs if job.key in due]
+
+    run_id = journal.start_run(kind)
+
+    def on_start(job: CrawlJob):
+        journal.mark_in_flight(kind, job.key)
+
+    def record(result: CrawlResult):
+        if on_result is not None:
+            try:
+                on_result(result)
+            except Exception as e:
+                result.error = e
+
+        if result.ok:
+            journal.mark_done(run_id, kind, result.job.key)
+        else:
+            journal.mark_failed(run_id, kind, result.job.key, f"{type(result.error).__name__}: {result.error}")
+
+    run_crawl(jobs, on_result=record, on_start=on_start, **crawl_kwargs)
+    return journal.finish_run(run_id)
@@ -1,15 +1,17 @@
 import argparse
 
-from dividend_tools import get_data_of_single_company, save_companies_data, get_companies_results, save_div_plots
+from dividend_tools import get_data_of_single_company, save_companies_data, get_companies_results
+from render_plots import render_plots
 
-def main(company: str):
+def main(company: str, force: bool = False):
     # comp = "asbis"
     df = get_data_of_single_company(get_company_url(company), ignore_save_errors=True)
     save_companies_data(df, company, ignore_save_errors=True)
     #
     get_companies_results(company, save_results=True)
 
-    save_div_plots(company)
+    # the plot is rendered again only when the scraped data changed
+    render_plots([company], workers=1, force=force)
 
 
 def get_company_url(company: str) -> str:
@@ -19,6 +21,7 @@ if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description="Analyze dividends of a company.")
     parser.add_argument("-c", "--company", type=str, required=True, help="Company name")
+    parser.add_argument("-f", "--force", action="store_true", help="Render the plot even if the data did not change")
 
     args = parser.parse_args()
 
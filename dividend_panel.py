@@ -0,0 +1,162 @@
+import argparse
+import os
+import sqlite3
+import time
+from typing import List, Optional
+
+import pandas as pd
+from tqdm import tqdm
+
+from utils_data import change_column_names, to_float_series
+
+DIVIDEND_PANEL_PATH = os.path.join("data", "dividend_panel.sqlite")
+BASE_COMPANIES_PATH = os.path.join("data", "companies")
+
+PANEL_COLUMNS = ["company", "ex_date", "payment_date", "dividend_per_share", "yield", "year"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dividends (
+    company TEXT NOT NULL,
+    ex_date TEXT,
+    payment_date TEXT,
+    dividend_per_share REAL,
+    yield REAL,
+    year INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS dividends_company ON dividends (company, year);
+CREATE INDEX IF NOT EXISTS dividends_year ON dividends (year);
+CREATE TABLE IF NOT EXISTS companies (
+    company TEXT PRIMARY KEY,
+    rows INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+def connect(path: str = DIVIDEND_PANEL_PATH) -> sqlite3.Connection:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(path, timeout=30)
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def to_panel_rows(df: pd.DataFrame, company_name: str) -> pd.DataFrame:
+    """
+    Converts the dividend table scraped from stockwatch.pl into typed panel rows.
+    The second column of the table holds the date determining the dividend year (used as ex-date), the "Data Dyw"
+    column holds the payment date.
+    :param df: DataFrame returned by get_data_of_single_company or read from data/companies
+    :param company_name: Name of the company
+    :return: DataFrame with PANEL_COLUMNS
+    """
+    df = df.copy()
+    df.columns = change_column_names(df.columns)
+
+    panel = pd.DataFrame({"company": company_name}, index=df.index)
+    panel["ex_date"] = pd.to_datetime(df.iloc[:, 1].astype(str).str.extract(r"(\d{4}-\d{2}-\d{2})")[0],
+                                      errors="coerce").dt.strftime("%Y-%m-%d")
+    panel["payment_date"] = pd.to_datetime(df["data_dyw"].astype(str).str.extract(r"(\d{4}-\d{2}-\d{2})")[0],
+                                           errors="coerce").dt.strftime("%Y-%m-%d")
+    panel["dividend_per_share"] = to_float_series(df["dyw_na_akcje"])
+    panel["yield"] = to_float_series(df["stopa"])
+    panel["year"] = df["rok"].astype(int)
+    return panel[PANEL_COLUMNS]
+
+
+def upsert_company_dividends(df: pd.DataFrame, company_name: str, path: str = DIVIDEND_PANEL_PATH):
+    """
+    Replaces the rows of a single company in the panel in one transaction.
+    :param df: Dividend table of the company, see to_panel_rows
+    :param company_name: Name of the company
+    :param path: Path to the panel database
+    """
+    panel = to_panel_rows(df, company_name)
+    connection = connect(path)
+    try:
+        with connection:
+            connection.execute("DELETE FROM dividends WHERE company = ?", (company_name,))
+            connection.executemany(f"INSERT INTO dividends ({', '.join(PANEL_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)",
+                                   panel.astype(object).where(panel.notna(), None).itertuples(index=False))
+            connection.execute("INSERT OR REPLACE INTO companies (company, rows, updated_at) VALUES (?, ?, ?)",
+                               (company_name, len(panel), time.time()))
+    finally:
+        connection.close()
+
+
+def load_dividends(companies: Optional[List[str]] = None, year_from: Optional[int] = None,
+                   year_to: Optional[int] = None, columns: Optional[List[str]] = None,
+                   path: str = DIVIDEND_PANEL_PATH) -> pd.DataFrame:
+    """
+    Loads dividends of selected companies or of the whole market.
+    Filters are evaluated by SQLite on the indexed columns, so only matching rows are read.
+    :param companies: Names of the companies, all companies if None
+    :param year_from: First year (inclusive)
+    :param year_to: Last year (inclusive)
+    :param columns: Subset of PANEL_COLUMNS to load, all if None
+    :param path: Path to the panel database
+    :return: DataFrame sorted by company and year
+    """
+    columns = columns or PANEL_COLUMNS
+    unknown = set(columns) - set(PANEL_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown panel columns {sorted(unknown)}")
+
+    conditions, params = list(), list()
+    if companies is not None:
+        conditions.append(f"company IN ({', '.join('?' * len(companies))})")
+        params.extend(companies)
+    if year_from is not None:
+        conditions.append("year >= ?")
+        params.append(year_from)
+    if year_to is not None:
+        conditions.append("year <= ?")
+        params.append(year_to)
+
+    query = f"SELECT {', '.join(columns)} FROM dividends"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY company, year, ex_date"
+
+    connection = connect(path)
+    try:
+        df = pd.read_sql_query(query, connection, params=params)
+    finally:
+        connection.close()
+
+    for col in ("ex_date", "payment_date"):
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col])
+    return df
+
+
+def list_companies(path: str = DIVIDEND_PANEL_PATH) -> List[str]:
+    connection = connect(path)
+    try:
+        return [row[0] for row in connection.execute("SELECT company FROM companies ORDER BY company")]
+    finally:
+        connection.close()
+
+
+def build_panel(companies_path: str = BASE_COMPANIES_PATH, path: str = DIVIDEND_PANEL_PATH):
+    """
+    Upserts all company CSV files into the panel, used to create the panel from existing data.
+    """
+    for file_name in tqdm(sorted(os.listdir(companies_path))):
+        company_name = os.path.splitext(file_name)[0]
+        try:
+            upsert_company_dividends(pd.read_csv(os.path.join(companies_path, file_name)), company_name, path)
+        except (KeyError, ValueError) as e:
+            print(f"Failed for {company_name}: {e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the consolidated dividend panel from data/companies")
+    parser.add_argument("-c", "--companies-path", type=str, default=BASE_COMPANIES_PATH,
+                        help="Directory with company CSV files")
+
+    args = parser.parse_args()
+
+    build_panel(args.companies_path)
+    print(f"Panel contains {len(list_companies())} companies")
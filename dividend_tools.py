@@ -1,7 +1,4 @@
-from copy import deepcopy
-from datetime import datetime
-import json
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 import numpy as np
 import os
 import pandas as pd
@@ -9,73 +6,32 @@ from pathlib import Path
 import re
 
 
-from html_utils import fetch_website_text
-from utils_data import change_column_names
+from html_utils import fetch_website_html
+from dividend_panel import upsert_company_dividends
+from instrument_store import get_isin_of_company
+from table_extraction import extract_table
+from utils_data import DIVIDEND_NUMERIC_COLUMNS, change_column_names, normalize_numeric_columns, to_float_series
 from utils_stock_price import get_stock_prices_yearly
 
 BASE_COMPANIES_PATH = os.path.join("data", "companies")
-ISIN_PATH = os.path.join("data", "isin.json")
 BASE_COMPANIES_RESULTS_PATH = os.path.join("data", "results")
 
 def get_data_of_single_company(url: str, ignore_save_errors: bool = False) -> pd.DataFrame:
 
-    def flatten(data_idxes: dict) -> dict:
-        for key, val in data_idxes.items():
-            if data_idxes[key][1] == 0:
-                data_idxes[key] = data_idxes[key][0]
-
-    txt = fetch_website_text(url)
-    if not txt:
+    html = fetch_website_html(url)
+    if not html:
         raise RuntimeError(f"Failed to fetch data from {url}")
-    rows = txt.split("\n\n\n\n\n")
-    data = []
 
-    for row in rows:
-        # Split each row into columns
-        columns = row.split("\n")
-        # Clean and filter empty strings
-        columns = [col.strip() for col in columns if col.strip()]
-        if columns:
-            data.append(columns)
-
-    # save_isin(data, get_company_name_from_stockwatch(url), ignore_save_errors=ignore_save_errors)
-
-    data_idxes = dict()
-    for i, entries in enumerate(data):
-        for j, entry in enumerate(entries):
-            if "Kalendarium dywidend" in entry:
-                data_idxes["headers"] = (i + 1, j)
-                data_idxes["data"] = (i + 2, j)
-
-    flatten(data_idxes)
-    table_headers = data[data_idxes["headers"]]
-    table_headers.insert(3, "Data Dyw")
-
-    # select idx of beginning of each row (company name)
-    divid_table = deepcopy(data[data_idxes["data"]])
-    company_name = divid_table[0]
-    k = 1
-    while data[data_idxes["data"] + k][0] == company_name:
-        divid_table += data[data_idxes["data"] + k]
-        k += 1
-
-    idxes = [i for i, val in enumerate(divid_table) if val == company_name]
-    idxes.append(len(divid_table))
-
-    rows = list()
-    for i in range(len(idxes) - 1):
-        row = divid_table[idxes[i]:idxes[i + 1]]
-        if len(row) > 3:
-            rows.append(check_and_correct_row(row, table_headers))
-        else:
-            raise RuntimeError(f"Something went wrong for {company_name} at {url}.")
+    table_headers, rows = extract_table(html, "Kalendarium dywidend", fill_headers={3: "Data Dyw"})
+    if not rows:
+        raise RuntimeError(f"Something went wrong for {url}.")
 
     df = pd.DataFrame(rows, columns=table_headers)
     years = df.iloc[:,1].apply(get_year)
 
     df["Rok"] = years
     df.sort_values(by="Rok", inplace=True)
-    return df
+    return normalize_numeric_columns(df, DIVIDEND_NUMERIC_COLUMNS)
 
 
 def get_year(text: str) -> int:
@@ -90,28 +46,13 @@ def get_year(text: str) -> int:
         raise ValueError(f"No valid date found in the text: {text}")
 
 
-def check_and_correct_row(row: list, header: list) -> list:
-    if len(row) == len(header):
-        return row
-
-    try:
-        datetime.strptime(row[3], "%Y-%m-%d")
-    except ValueError as e:
-        row.insert(3, "")
-
-    if len(row) + 1 == len(header):
-        row = row + [""]
-    else:
-        row = row + [""] * (len(header) - len(row))
-
-    return row
-
 def save_companies_data(df: pd.DataFrame, company_name: str, ignore_save_errors: bool = False):
     """
     Saves the data of a single company to a CSV file.
     :param df: DataFrame containing the data of the company
     :param company_name: Name of the company
     :param ignore_save_errors: If True, ignores errors when saving the data
+    The data is also upserted into the consolidated dividend panel.
     """
     save_path = Path(BASE_COMPANIES_PATH) / f"{company_name}.csv"
     if save_path.exists() and not ignore_save_errors:
@@ -121,59 +62,25 @@ def save_companies_data(df: pd.DataFrame, company_name: str, ignore_save_errors:
     df.to_csv(save_path, index=False)
     print(f"Saved data for {company_name} to {save_path}")
 
+    upsert_company_dividends(df, company_name)
+
 def get_financial_results_url(company_name: str) -> str:
     return f"https://strefainwestorow.pl/notowania/spolki/{get_isin_of_company(company_name)}/wyniki-finansowe"
 
 def get_companies_results(company_name: str, save_results: bool=False) -> pd.DataFrame:
 
-    def flatten(data_idxes: dict) -> dict:
-        for key, val in data_idxes.items():
-            if data_idxes[key][1] == 0:
-                data_idxes[key] = data_idxes[key][0]
-
-    # url =f"https://strefainwestorow.pl/notowania/spolki/{get_isin_of_company(company_name)}/wyniki-finansowe"
     url = get_financial_results_url(company_name)
 
-    txt = fetch_website_text(url)
+    html = fetch_website_html(url)
 
-    if not txt:
+    if not html:
         raise RuntimeError(f"Failed to fetch data from {url}")
-    rows = txt.split("\n\n\n\n\n")
-    data = []
+
+    table_headers, rows = extract_table(html, "Stanowisko", last=False)
 
     for row in rows:
-        # Split each row into columns
-        columns = row.split("\n")
-        # Clean and filter empty strings
-        columns = [col.strip() for col in columns if col.strip()]
-        if columns:
-            data.append(columns)
-
-    data_idxes = dict()
-    tagged = False
-    for i, entries in enumerate(data):
-        for j, entry in enumerate(entries):
-            if f"Stanowisko" in entry and not tagged:
-                data_idxes["headers"] = (i, j)
-                data_idxes["data"] = (i + 1, j)
-                # data_idxes["data2"] = (i + 2, j)
-                tagged = True
-
-
-    flatten(data_idxes)
-    table_headers = data[data_idxes["headers"]]
-
-    # select idx of beginning of each row name starting from letters
-    idxes = [i for i, val in enumerate(data[data_idxes["data"]]) if val[0].isalpha()]
-    idxes.append(len(data[data_idxes["data"]]))
-
-    rows = list()
-    for i in range(len(idxes) - 1):
-        rows.append(data[data_idxes["data"]][idxes[i]:idxes[i + 1]])
-
-    for i in range(len(rows)):
-        if len(rows[i]) != len(table_headers):
-            raise RuntimeError(f"Something went wrong with the data format {rows[i]}.")
+        if len(row) != len(table_headers):
+            raise RuntimeError(f"Something went wrong with the data format {row}.")
 
     df = pd.DataFrame(rows, columns=table_headers)
 
@@ -183,6 +90,7 @@ def get_companies_results(company_name: str, save_results: bool=False) -> pd.Dat
     cols[0] = "Rok"
     df.columns = cols
     df = df[1:]  # Remove the first row which is now the header
+    df = normalize_numeric_columns(df, exclude=["rok"])
 
     if save_results:
         os.makedirs(BASE_COMPANIES_RESULTS_PATH, exist_ok=True)
@@ -193,71 +101,43 @@ def get_companies_results(company_name: str, save_results: bool=False) -> pd.Dat
     return df
 
 
-def get_isin_of_company(company_name: str) -> str:
-
-    path = Path(ISIN_PATH)
-    with open(path, "r") as file:
-        isin_data = json.load(file)
-
-    isin = isin_data.get(company_name, None)
-    if not isin:
-        raise ValueError(f"ISIN for {company_name} not found in {ISIN_PATH}")
-    return isin
-
 # plotting functions
 
-def save_div_plots(company_name: str):
-    def check_results(company: str) -> bool:
-        return os.path.exists(os.path.join("data", "results", company))
-
-    output = os.path.join("data", "plots")
+def save_div_plots(company_name: str, output: str = os.path.join("data", "plots")) -> str:
+    """
+    Saves the dividend plot of a company, together with its net profit when its results are available.
+    :param company_name: Name of the company
+    :param output: Directory of the plots
+    :return: Path to the saved plot
+    """
     os.makedirs(output, exist_ok=True)
 
     comp_file = f"{company_name}.csv"
     company_path = Path("data") / "companies" / comp_file
     df_div = prepare_div_df(company_path)
 
-
-    company_path = Path("data") / "results" / comp_file
-    df_res = prepare_results_df(company_path)
-
-    if check_results(comp_file):
-        prepare_div_results_plots(df_div, df_res, output)
+    results_path = Path("data") / "results" / comp_file
+    if results_path.exists():
+        df_res = prepare_results_df(results_path)
+        return prepare_div_results_plots(df_div, df_res, output)
     else:
-        prepare_div_plot(df_div, output)
+        return prepare_div_plot(df_div, output)
 
 
 def prepare_div_df(file_path: str) -> pd.DataFrame:
     df = pd.read_csv(file_path)
     df.columns = change_column_names(df.columns)
-    df["dyw_na_akcje"] = df["dyw_na_akcje"].apply(to_float)
-    df["stopa"] = df["stopa"].apply(to_float)
+    df["dyw_na_akcje"] = to_float_series(df["dyw_na_akcje"])
+    df["stopa"] = to_float_series(df["stopa"])
     # df["rok"] = pd.to_datetime(df["data_dyw"]).apply(lambda x: x.year)
 
     return df
 
-def to_float(val: str) -> float:
-    if isinstance(val, str):
-        val = val.replace(",", ".")
-        if "\xa0" in val:
-            val = val.replace('\xa0', "")
-        if "%" in val:
-            val = val.replace("%", "")
-            val = float(val)
-            val = val * 0.01
-        elif " (" in val:
-            val = val.split(" ")[0]
-            val = float(val)
-        else:
-            val = float(val)
-    return val
-
-
 def prepare_results_df(file_path: str) -> pd.DataFrame:
     df = pd.read_csv(file_path)
     df.columns = change_column_names(df.columns)
     for col in df.columns:
-        df[col] = df[col].apply(to_float)
+        df[col] = to_float_series(df[col])
     # df["dyw_na_akcje"] = df["dyw_na_akcje"].apply(to_float)
     # df["stopa"] = df["stopa"].apply(to_float)
     # df["rok"] = pd.to_datetime(df["data_dyw"]).apply(lambda x: x.year)
@@ -272,12 +152,14 @@ def add_same_years(df: pd.DataFrame) -> pd.DataFrame:
     return df2
 
 
-def prepare_div_plot(df: pd.DataFrame, output_path: str):
+def prepare_div_plot(df: pd.DataFrame, output_path: str) -> str:
     os.makedirs(output_path, exist_ok=True)
 
     df = add_same_years(df)
 
-    fig, ax1 = plt.subplots()
+    # Figure API instead of pyplot, so plots do not share global state and can be rendered in parallel
+    fig = Figure()
+    ax1 = fig.subplots()
 
     # Bar plot on left y-axis
     ax1.bar(df["rok"], df["dyw_na_akcje"], color="skyblue", label="dyw_na_akcje")
@@ -302,21 +184,20 @@ def prepare_div_plot(df: pd.DataFrame, output_path: str):
     fig.suptitle(company_name)
     fig.legend(loc="upper left")
 
-    plt.tight_layout()
+    fig.tight_layout()
 
     save_file = f"{company_name}.png"
     fig.savefig(os.path.join(output_path, save_file))
     print(f"Saved plot with dividends only to {os.path.join(output_path, save_file)}")
 
-    plt.close()
-
-    # plt.show()
+    return os.path.join(output_path, save_file)
 
 
-def prepare_div_results_plots(df_div: pd.DataFrame, df_results: pd.DataFrame, output_path: str):
+def prepare_div_results_plots(df_div: pd.DataFrame, df_results: pd.DataFrame, output_path: str) -> str:
     df_div = add_same_years(df_div)
 
-    fig, (ax1, ax3) = plt.subplots(2, 1, figsize=(8, 8), sharex=True)
+    fig = Figure(figsize=(8, 8))
+    ax1, ax3 = fig.subplots(2, 1, sharex=True)
 
     # First subplot: bar and line with twin y-axis
     ax1.bar(df_div["rok"], df_div["dyw_na_akcje"], color="skyblue", label="dyw_na_akcje")
@@ -351,11 +232,10 @@ def prepare_div_results_plots(df_div: pd.DataFrame, df_results: pd.DataFrame, ou
 
     ax3.legend(loc="upper center")
 
-    plt.tight_layout()
+    fig.tight_layout()
 
     save_file = f"{company_name}.png"
     fig.savefig(os.path.join(output_path, save_file))
     print(f"Saved plot with results to {os.path.join(output_path, save_file)}")
 
-    plt.close()
-    # plt.show()
\ No newline at end of file
+    return os.path.join(output_path, save_file)
@@ -1,21 +1,25 @@
 import argparse
 import json
 import os
-import random
 from tqdm import tqdm
 from typing import Optional
 
 import bs4
 import pandas as pd
 from pathlib import Path
-from time import sleep
-from copy import deepcopy
-from datetime import datetime
 import re
 
-from html_utils import fetch_website_text, fetch_website_text_with_soup, get_binary_response
+from html_utils import HTML_PARSER, HTML_PARSERS, fetch_website_html, fetch_website_text_with_soup, get_binary_response, \
+    set_html_parser, website_get_soup
+from http_cache import print_cache_stats
+from http_session import print_connection_stats
+from dividend_panel import upsert_company_dividends
+from instrument_store import get_isin_of_company, get_store
+from utils_data import DIVIDEND_NUMERIC_COLUMNS, normalize_numeric_columns
+from table_extraction import extract_table, find_table_in_soup, table_to_rows
+from crawl_journal import CrawlJournal, RunReport
+from crawler import CrawlResult, companies_in_dir, dividend_jobs_from_links_file, results_jobs, run_journaled_crawl
 
-ISIN_PATH = os.path.join("data", "isin.json")
 BASE_DIVIDEND_PATH = os.path.join("data", "dividends")
 BASE_COMPANIES_PATH = os.path.join("data", "companies")
 BASE_COMPANIES_RESULTS_PATH = os.path.join("data", "results")
@@ -39,97 +43,29 @@ def save_isin(data: list, company_name: str, ignore_save_errors: bool = False):
     if isin is not None:
 
         isin = isin.split(":")[-1].strip()
-
-        with open("data/isin.json", "r") as file:
-            isin_data = json.load(file)
-
-            if isin_data.get(company_name) is not None and not ignore_save_errors:
-                raise RuntimeError(f"ISIN for {company_name} already exists in {ISIN_PATH}")
-
-        isin_data[company_name] = isin
-        with open("data/isin.json", "w") as file:
-            json.dump(isin_data, file, indent=4)
+        get_store().upsert(company_name, isin=isin, overwrite=ignore_save_errors)
 
 def get_company_name_from_stockwatch(url: str) -> str:
     path = Path(url)
     name = path.name
     return name.split(",")[0]
 
-def check_and_correct_row(row: list, header: list) -> list:
-    if len(row) == len(header):
-        return row
-
-    try:
-        datetime.strptime(row[3], "%Y-%m-%d")
-    except ValueError as e:
-        row.insert(3, "")
-
-    if len(row) + 1 == len(header):
-        row = row + [""]
-    else:
-        row = row + [""] * (len(header) - len(row))
-
-    return row
-
 def get_data_of_single_company(url: str, ignore_save_errors: bool = False) -> pd.DataFrame:
 
-    def flatten(data_idxes: dict) -> dict:
-        for key, val in data_idxes.items():
-            if data_idxes[key][1] == 0:
-                data_idxes[key] = data_idxes[key][0]
-
-    txt = fetch_website_text(url)
-    if not txt:
+    html = fetch_website_html(url)
+    if not html:
         raise RuntimeError(f"Failed to fetch data from {url}")
-    rows = txt.split("\n\n\n\n\n")
-    data = []
-
-    for row in rows:
-        # Split each row into columns
-        columns = row.split("\n")
-        # Clean and filter empty strings
-        columns = [col.strip() for col in columns if col.strip()]
-        if columns:
-            data.append(columns)
-
-    # save_isin(data, get_company_name_from_stockwatch(url), ignore_save_errors=ignore_save_errors)
 
-    data_idxes = dict()
-    for i, entries in enumerate(data):
-        for j, entry in enumerate(entries):
-            if "Kalendarium dywidend" in entry:
-                data_idxes["headers"] = (i + 1, j)
-                data_idxes["data"] = (i + 2, j)
-
-    flatten(data_idxes)
-    table_headers = data[data_idxes["headers"]]
-    table_headers.insert(3, "Data Dyw")
-
-    # select idx of beginning of each row (company name)
-    divid_table = deepcopy(data[data_idxes["data"]])
-    company_name = divid_table[0]
-    k = 1
-    while data[data_idxes["data"] + k][0] == company_name:
-        divid_table += data[data_idxes["data"] + k]
-        k += 1
-
-    idxes = [i for i, val in enumerate(divid_table) if val == company_name]
-    idxes.append(len(divid_table))
-
-    rows = list()
-    for i in range(len(idxes) - 1):
-        row = divid_table[idxes[i]:idxes[i + 1]]
-        if len(row) > 3:
-            rows.append(check_and_correct_row(row, table_headers))
-        else:
-            raise RuntimeError(f"Something went wrong for {company_name} at {url}.")
+    table_headers, rows = extract_table(html, "Kalendarium dywidend", fill_headers={3: "Data Dyw"})
+    if not rows:
+        raise RuntimeError(f"Something went wrong for {url}.")
 
     df = pd.DataFrame(rows, columns=table_headers)
     years = df.iloc[:,1].apply(get_year)
 
     df["Rok"] = years
     df.sort_values(by="Rok", inplace=True)
-    return df
+    return normalize_numeric_columns(df, DIVIDEND_NUMERIC_COLUMNS)
 
 def get_year(text: str) -> int:
 
@@ -147,46 +83,12 @@ def get_data_of_aristocrats(url: str, aristoctrat_years: int = 10, save_table: b
     if aristoctrat_years not in [5, 10]:
         raise ValueError("aristoctrat_years must be either 5 or 10")
 
-    def flatten(data_idxes: dict) -> dict:
-        for key, val in data_idxes.items():
-            data_idxes[key] = data_idxes[key][0]
-
-    txt, soup = fetch_website_text_with_soup(url)
-    if not txt:
+    soup = website_get_soup(url)
+    if soup is None:
         raise RuntimeError(f"Failed to fetch data from {url}")
-    rows = txt.split("\n\n\n\n\n")
-    data = []
-
-    for row in rows:
-        # Split each row into columns
-        columns = row.split("\n")
-        # Clean and filter empty strings
-        columns = [col.strip() for col in columns if col.strip()]
-        if columns:
-            data.append(columns)
-
-    data_idxes = dict()
-    for i, entries in enumerate(data):
-        for j, entry in enumerate(entries):
-            if f"Dywidendowi arystokraci {aristoctrat_years} LAT" in entry:
-                data_idxes["headers"] = (i + 1, j)
-                data_idxes["data"] = (i + 2, j)
-
-    flatten(data_idxes)
-    table_headers = data[data_idxes["headers"]]
-    table_headers.insert(3, "Data Dyw")
-
-    # select idx of beginning of each row (company name in capital letters)
-    idxes = [i for i, val in enumerate(data[data_idxes["data"]]) if val.isupper()]
-    idxes.append(len(data[data_idxes["data"]]))
-
-    rows = list()
-    for i in range(len(idxes) - 1):
-        rows.append(data[data_idxes["data"]][idxes[i]:idxes[i + 1]])
 
-    for i in range(len(rows)):
-        if len(rows[i]) != len(table_headers):
-            rows[i] = rows[i] + [""] * (len(table_headers) - len(rows[i]))
+    table = find_table_in_soup(soup, f"Dywidendowi arystokraci {aristoctrat_years} LAT")
+    table_headers, rows = table_to_rows(table, fill_headers={3: "Data Dyw"})
 
     df = pd.DataFrame(rows, columns=table_headers)
 
@@ -199,6 +101,8 @@ def get_data_of_aristocrats(url: str, aristoctrat_years: int = 10, save_table: b
         links = get_companies_links(soup, df["Spółka"].unique())
         with open(os.path.join(BASE_DIVIDEND_PATH, f"aristocrats_{aristoctrat_years}_years_links.json"), "w") as file:
             json.dump(links, file, indent=4)
+        for company, link in links.items():
+            get_store().upsert(company, stockwatch_url=link, overwrite=True)
 
     return df
 
@@ -228,6 +132,7 @@ def save_companies_data(df: pd.DataFrame, company_name: str, ignore_save_errors:
     :param df: DataFrame containing the data of the company
     :param company_name: Name of the company
     :param ignore_save_errors: If True, ignores errors when saving the data
+    The data is also upserted into the consolidated dividend panel.
     """
     save_path = Path(BASE_COMPANIES_PATH) / f"{company_name}.csv"
     if save_path.exists() and not ignore_save_errors:
@@ -237,66 +142,22 @@ def save_companies_data(df: pd.DataFrame, company_name: str, ignore_save_errors:
     df.to_csv(save_path, index=False)
     print(f"Saved data for {company_name} to {save_path}")
 
-def get_isin_of_company(company_name: str) -> str:
-
-    path = Path(ISIN_PATH)
-    with open(path, "r") as file:
-        isin_data = json.load(file)
-
-    isin = isin_data.get(company_name, None)
-    if not isin:
-        raise ValueError(f"ISIN for {company_name} not found in {ISIN_PATH}")
-    return isin
+    upsert_company_dividends(df, company_name)
 
 def get_companies_results(company_name: str, save_results: bool=False) -> pd.DataFrame:
 
-    def flatten(data_idxes: dict) -> dict:
-        for key, val in data_idxes.items():
-            if data_idxes[key][1] == 0:
-                data_idxes[key] = data_idxes[key][0]
-
     url =f"https://strefainwestorow.pl/notowania/spolki/{get_isin_of_company(company_name)}/wyniki-finansowe"
 
-    txt = fetch_website_text(url)
+    html = fetch_website_html(url)
 
-    if not txt:
+    if not html:
         raise RuntimeError(f"Failed to fetch data from {url}")
-    rows = txt.split("\n\n\n\n\n")
-    data = []
-
-    for row in rows:
-        # Split each row into columns
-        columns = row.split("\n")
-        # Clean and filter empty strings
-        columns = [col.strip() for col in columns if col.strip()]
-        if columns:
-            data.append(columns)
-
-    data_idxes = dict()
-    tagged = False
-    for i, entries in enumerate(data):
-        for j, entry in enumerate(entries):
-            if f"Stanowisko" in entry and not tagged:
-                data_idxes["headers"] = (i, j)
-                data_idxes["data"] = (i + 1, j)
-                # data_idxes["data2"] = (i + 2, j)
-                tagged = True
-
-
-    flatten(data_idxes)
-    table_headers = data[data_idxes["headers"]]
 
-    # select idx of beginning of each row name starting from letters
-    idxes = [i for i, val in enumerate(data[data_idxes["data"]]) if val[0].isalpha()]
-    idxes.append(len(data[data_idxes["data"]]))
+    table_headers, rows = extract_table(html, "Stanowisko", last=False)
 
-    rows = list()
-    for i in range(len(idxes) - 1):
-        rows.append(data[data_idxes["data"]][idxes[i]:idxes[i + 1]])
-
-    for i in range(len(rows)):
-        if len(rows[i]) != len(table_headers):
-            raise RuntimeError(f"Something went wrong with the data format {rows[i]}.")
+    for row in rows:
+        if len(row) != len(table_headers):
+            raise RuntimeError(f"Something went wrong with the data format {row}.")
 
     df = pd.DataFrame(rows, columns=table_headers)
 
@@ -306,6 +167,7 @@ def get_companies_results(company_name: str, save_results: bool=False) -> pd.Dat
     cols[0] = "Rok"
     df.columns = cols
     df = df[1:]  # Remove the first row which is now the header
+    df = normalize_numeric_columns(df, exclude=["rok"])
 
     if save_results:
         os.makedirs(BASE_COMPANIES_RESULTS_PATH, exist_ok=True)
@@ -338,8 +200,27 @@ def get_company_stock_price(company_name: str, date: Optional[str] = None, save_
 
 
 
+def refresh_aristocrats(links_path: str, journal: CrawlJournal, **crawl_kwargs) -> RunReport:
+    """
+    Fetches the dividend history of all companies from the links file which are not fetched yet.
+    :param links_path: Path to the aristocrats_*_years_links.json file
+    :param journal: Journal of the crawl
+    """
+    def on_result(result: CrawlResult):
+        if result.ok:
+            save_companies_data(result.df, result.job.key, ignore_save_errors=True)
+        else:
+            print(f"Failed for {result.job.url}: {result.error}")
+
+    return run_journaled_crawl(journal, "dividends", dividend_jobs_from_links_file(links_path), on_result=on_result,
+                               is_done=lambda job: (Path(BASE_COMPANIES_PATH) / f"{job.key}.csv").exists(),
+                               **crawl_kwargs)
+
+
 def main(args: argparse.Namespace):
 
+    set_html_parser(args.parser)
+
 
     # if not os.path.exists(BASE_DIVIDEND_PATH):
 
@@ -366,38 +247,27 @@ def main(args: argparse.Namespace):
     #
     get_companies_results(comp, save_results=True)
 
-    for company_name in tqdm(os.listdir(BASE_COMPANIES_PATH)):
-        company_name = os.path.splitext(company_name)[0]
-        save_path = Path(BASE_COMPANIES_RESULTS_PATH) / f"{company_name}.csv"
-        if not os.path.exists(save_path):
-
-            s = random.randint(3,7)
-            sleep(s)
-            try:
-                df = get_companies_results(company_name, save_results=True)
-            except Exception as e:
-                print(f"Failed for {company_name}")
-                #Compaies not present are from newconnect
-                #https://www.bankier.pl/gielda/notowania/new-connect/POLTRONIC/wyniki-finansowe/jednostkowy/kwartalny/standardowy/1
-                continue
-
+    journal = CrawlJournal()
+    jobs = results_jobs(companies_in_dir(BASE_COMPANIES_PATH), save_results=True)
+    with tqdm() as progress:
+        def on_result(result: CrawlResult):
+            progress.update(1)
+            if not result.ok:
+                # Compaies not present are from newconnect
+                # https://www.bankier.pl/gielda/notowania/new-connect/POLTRONIC/wyniki-finansowe/jednostkowy/kwartalny/standardowy/1
+                print(f"Failed for {result.job.key}: {result.error}")
 
+        report = run_journaled_crawl(journal, "results", jobs, on_result=on_result,
+                                     is_done=lambda job: (Path(BASE_COMPANIES_RESULTS_PATH) / f"{job.key}.csv").exists(),
+                                     max_per_host=args.max_per_host, host_delay=args.host_delay)
+    print(report)
 
-    # company_links = json.load(open(os.path.join(BASE_DIVIDEND_PATH, "aristocrats_5_years_links.json"), "r"))
-    #
-    # for company_name, url in tqdm(company_links.items()):
-    #     save_path = Path(BASE_COMPANIES_PATH) / f"{company_name}.csv"
-    #     if not os.path.exists(save_path):
-    #
-    #         s = random.randint(3,7)
-    #         sleep(s)
-    #         try:
-    #             df = get_data_of_single_company(url, ignore_save_errors=True)
-    #             save_companies_data(df, company_name, ignore_save_errors=True)
-    #         except Exception as e:
-    #             print(f"Failed for {url}")
-    #             continue
+    if args.refresh_aristocrats:
+        print(refresh_aristocrats(os.path.join(BASE_DIVIDEND_PATH, "aristocrats_5_years_links.json"), journal,
+                                  max_per_host=args.max_per_host, host_delay=args.host_delay))
 
+    print_connection_stats()
+    print_cache_stats()
 
     # df = get_data_of_single_company("https://www.stockwatch.pl/gpw/sniezka,notowania,dywidendy.aspx",
     #                             ignore_save_errors=True)
@@ -409,6 +279,13 @@ if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description="Fetch data from StockWatch website")
     parser.add_argument("--url", type=str, default=URL_ARISTOCRATS, help="URL to fetch data from")
+    parser.add_argument("--max-per-host", type=int, default=2, help="Maximum number of concurrent requests per host")
+    parser.add_argument("--host-delay", type=float, default=0.0,
+                        help="Minimal delay (in seconds) between requests to the same host")
+    parser.add_argument("--parser", type=str, default=HTML_PARSER, choices=list(HTML_PARSERS),
+                        help="HTML parser backend")
+    parser.add_argument("--refresh-aristocrats", action="store_true",
+                        help="Fetch dividend history of aristocrats which are not saved yet")
 
     args = parser.parse_args()
 
@@ -0,0 +1,152 @@
+import argparse
+import io
+import json
+import os
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+
+import pandas as pd
+import requests
+from tqdm import tqdm
+from xlrd import XLRDError
+
+from html_utils import fetch_content
+from utils_data import change_column_names
+
+MARKET_PRICES_PATH = os.path.join("data", "stock_prices", "market")
+INGESTED_DATES_FILE = "_ingested_dates.json"
+
+GPW_ARCHIVE_URL = "https://www.gpw.pl/archiwum-notowan?fetch=1&type=10&instrument=&date={date}"
+# text of the archive page returned for days without trading
+NO_TRADING_MARKERS = ("brak danych",)
+
+
+def market_archive_url(day: date) -> str:
+    return GPW_ARCHIVE_URL.format(date=day.strftime("%d-%m-%Y"))
+
+
+def fetch_market_day(day: date) -> Optional[pd.DataFrame]:
+    """
+    Fetches the quotes of all instruments of the GPW main market for a single trading day.
+    Any other response than the XLS file or a page confirming there was no trading raises, so the day is retried.
+    :param day: Trading day
+    :return: DataFrame with normalized column names, None for days without trading
+    """
+    if day.weekday() >= 5:
+        return None
+
+    fetched = fetch_content(market_archive_url(day))
+    if not fetched.content:
+        raise ValueError(f"Empty response for {day}")
+    if fetched.content.lstrip()[:1] == b"<":
+        # days without trading return an HTML page instead of XLS, but so do maintenance and error pages
+        if any(marker in fetched.text.lower() for marker in NO_TRADING_MARKERS):
+            return None
+        raise ValueError(f"Unexpected HTML page instead of the XLS file for {day}")
+
+    df = pd.read_excel(io.BytesIO(fetched.content))
+    if df.empty:
+        return df
+
+    df.columns = change_column_names(df.columns)
+    df["data"] = pd.to_datetime(df["data"])
+    df["nazwa"] = df["nazwa"].astype(str).str.strip().str.lower()
+    return df
+
+
+class MarketPriceStore:
+    """
+    Local store of daily quotes with one CSV file per instrument and a list of already ingested days.
+    """
+
+    def __init__(self, path: str = MARKET_PRICES_PATH):
+        self.path = path
+        self._dates_path = os.path.join(path, INGESTED_DATES_FILE)
+
+    def ingested_dates(self) -> set:
+        if not os.path.exists(self._dates_path):
+            return set()
+        with open(self._dates_path, "r") as file:
+            return set(json.load(file))
+
+    def _save_ingested_dates(self, dates: set):
+        tmp_path = self._dates_path + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(sorted(dates), file, indent=4)
+        os.replace(tmp_path, self._dates_path)
+
+    def instrument_path(self, instrument: str) -> str:
+        return os.path.join(self.path, f"{instrument}.csv")
+
+    def append_day(self, day: date, df: pd.DataFrame):
+        """
+        Appends the quotes of a day to the files of the instruments and marks the day as ingested.
+        :param day: Trading day
+        :param df: Quotes of all instruments for the day (may be empty for days without trading)
+        """
+        os.makedirs(self.path, exist_ok=True)
+        for instrument, rows in df.groupby("nazwa") if not df.empty else []:
+            path = self.instrument_path(instrument)
+            rows.to_csv(path, mode="a", header=not os.path.exists(path), index=False)
+
+        dates = self.ingested_dates()
+        dates.add(day.isoformat())
+        self._save_ingested_dates(dates)
+
+    def missing_dates(self, start: date, end: date) -> List[date]:
+        """
+        Returns business days between start and end (inclusive) which are not ingested yet.
+        """
+        ingested = self.ingested_dates()
+        return [day.date() for day in pd.bdate_range(start, end) if day.date().isoformat() not in ingested]
+
+    def load(self, instrument: str) -> pd.DataFrame:
+        """
+        Loads the quotes of a single instrument indexed by date.
+        :param instrument: Name of the instrument (lowercase, as in the GPW archive)
+        """
+        path = self.instrument_path(instrument.lower())
+        if not os.path.exists(path):
+            raise ValueError(f"No quotes of {instrument} in {self.path}")
+        df = pd.read_csv(path, parse_dates=["data"])
+        df.drop_duplicates(subset="data", keep="last", inplace=True)
+        df.set_index("data", inplace=True)
+        df.sort_index(inplace=True)
+        return df
+
+
+def ingest_market_archive(start: date, end: Optional[date] = None, store: Optional[MarketPriceStore] = None) -> int:
+    """
+    Downloads the whole-market files of all missing days and appends them to the store, one request per day.
+    :param start: First day to ingest
+    :param end: Last day to ingest, yesterday if None (quotes of the current day are not final)
+    :param store: Price store, the default one if None
+    :return: Number of ingested days
+    """
+    store = store or MarketPriceStore()
+    end = end or date.today() - timedelta(days=1)
+
+    ingested = 0
+    for day in tqdm(store.missing_dates(start, end)):
+        try:
+            df = fetch_market_day(day)
+        except (requests.exceptions.RequestException, ValueError, XLRDError) as e:
+            print(f"Failed for {day}: {e}")
+            continue
+        store.append_day(day, pd.DataFrame() if df is None else df)
+        ingested += 1
+
+    return ingested
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest daily whole-market quotes from the GPW archive")
+    parser.add_argument("-s", "--start", type=str, required=True, help="First day (yyyy-mm-dd)")
+    parser.add_argument("-e", "--end", type=str, default=None, help="Last day (yyyy-mm-dd), yesterday by default")
+
+    args = parser.parse_args()
+
+    start = datetime.strptime(args.start, "%Y-%m-%d").date()
+    end = datetime.strptime(args.end, "%Y-%m-%d").date() if args.end else None
+
+    print(f"Ingested {ingest_market_archive(start, end)} days")
@@ -1,7 +1,12 @@
 import bs4
+import importlib
 import requests
 from bs4 import BeautifulSoup
-from typing import Optional, Tuple
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from http_cache import get_cache
+from http_session import http_get
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:136.0) Gecko/20100101 Firefox/136.0"
@@ -23,15 +28,117 @@ inne:
 
 """
 
-def website_get_soup(url: str, headers: dict = HEADERS) -> bs4.BeautifulSoup:
+HTML_PARSER = "html.parser"
+SELECTOLAX = "selectolax"
+# parser name -> module required by it
+HTML_PARSERS = {
+    HTML_PARSER: None,
+    "lxml": "lxml",
+    "html5lib": "html5lib",
+    SELECTOLAX: "selectolax.lexbor",
+}
+
+_html_parser = HTML_PARSER
+
 
+def _importable(module: Optional[str]) -> bool:
+    if module is None:
+        return True
     try:
-        # Send a GET request to the URL
-        response = requests.get(url, headers=headers)
+        importlib.import_module(module)
+        return True
+    except ImportError:
+        return False
+
+
+def available_html_parsers() -> List[str]:
+    return [parser for parser, module in HTML_PARSERS.items() if _importable(module)]
+
+
+def set_html_parser(parser: str):
+    """
+    Selects the parser backend used globally when no parser is given explicitly.
+    :param parser: One of HTML_PARSERS
+    """
+    global _html_parser
+    if parser not in HTML_PARSERS:
+        raise ValueError(f"Unknown parser {parser}, must be one of {list(HTML_PARSERS)}")
+    if parser not in available_html_parsers():
+        raise ValueError(f"Parser {parser} is not installed")
+    _html_parser = parser
+
+
+def get_html_parser(parser: Optional[str] = None, allow_selectolax: bool = False) -> str:
+    """
+    Resolves the parser backend of a call.
+    selectolax does not build BeautifulSoup trees, so callers which need a soup get the fastest BeautifulSoup parser
+    instead of it.
+    :param parser: Parser requested by the call, the globally selected one if None
+    :param allow_selectolax: If True, the caller handles the selectolax backend itself
+    """
+    parser = parser or _html_parser
+    if parser == SELECTOLAX and not allow_selectolax:
+        return "lxml" if "lxml" in available_html_parsers() else HTML_PARSER
+    return parser
+
+
+@dataclass
+class FetchedContent:
+    content: bytes
+    encoding: Optional[str] = None
+    from_cache: bool = False
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+
+def fetch_content(url: str, headers: dict = HEADERS) -> FetchedContent:
+    """
+    Fetches the content of the URL, serving it from the HTTP cache when possible.
+    Stale cache entries are revalidated with a conditional GET (If-None-Match / If-Modified-Since).
+    :param url: URL to fetch
+    :param headers: Request headers
+    :return: Content of the response
+    """
+    cache = get_cache()
+    if cache is None:
+        response = http_get(url, headers=headers)
         response.raise_for_status()  # Raise an exception for HTTP errors
+        return FetchedContent(response.content, response.encoding or response.apparent_encoding)
+
+    key = cache.make_key(url, headers)
+    entry = cache.get(key)
+    if entry is not None and cache.is_fresh(entry):
+        cache.count("hits")
+        return FetchedContent(cache.read_body(key), entry.encoding, from_cache=True)
+
+    request_headers = dict(headers)
+    if entry is not None:
+        request_headers.update(cache.conditional_headers(entry))
+
+    response = http_get(url, headers=request_headers)
+    if entry is not None and response.status_code == 304:
+        cache.count("revalidated")
+        cache.mark_revalidated(key)
+        return FetchedContent(cache.read_body(key), entry.encoding, from_cache=True)
+
+    response.raise_for_status()  # Raise an exception for HTTP errors
+    cache.count("misses")
+    encoding = response.encoding or response.apparent_encoding
+    cache.store(key, url, response.content, encoding=encoding, etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"))
+    return FetchedContent(response.content, encoding)
+
+
+def website_get_soup(url: str, headers: dict = HEADERS, parser: Optional[str] = None) -> bs4.BeautifulSoup:
+
+    try:
+        # Send a GET request to the URL
+        fetched = fetch_content(url, headers=headers)
 
         # Parse the HTML content using BeautifulSoup
-        soup = BeautifulSoup(response.text, 'html.parser')
+        soup = BeautifulSoup(fetched.text, get_html_parser(parser))
 
         # Extract and return the text content
         return soup
@@ -39,6 +146,13 @@ def website_get_soup(url: str, headers: dict = HEADERS) -> bs4.BeautifulSoup:
         print(f"An error occurred: {e}")
         return None
 
+def fetch_website_html(url: str, headers: dict = HEADERS) -> Optional[str]:
+    try:
+        return fetch_content(url, headers=headers).text
+    except requests.exceptions.RequestException as e:
+        print(f"An error occurred: {e}")
+        return None
+
 def fetch_website_text(url: str) -> Optional[str]:
 
     # Parse the HTML content using BeautifulSoup
@@ -62,11 +176,10 @@ def fetch_website_text_with_soup(url: str) -> Tuple[Optional[str], bs4.Beautiful
 def get_binary_response(url: str, save_path: str, headers: dict = HEADERS):
     try:
         # Send a GET request to the URL
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()  # Raise an exception for HTTP errors
+        fetched = fetch_content(url, headers=headers)
 
         with open(save_path, 'wb') as file:
-            file.write(response.content)
+            file.write(fetched.content)
 
             return True
 
@@ -0,0 +1,203 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from http_session import get_host
+
+HTTP_CACHE_PATH = os.path.join("data", "http_cache")
+
+DEFAULT_TTL = 6 * 3600
+HOST_TTLS = {
+    "www.stockwatch.pl": 24 * 3600,
+    "strefainwestorow.pl": 24 * 3600,
+    "www.gpw.pl": 12 * 3600,
+    "www.multpl.com": 24 * 3600,
+}
+
+
+@dataclass
+class CacheEntry:
+    url: str
+    fetched_at: float
+    last_access: float
+    size: int
+    encoding: Optional[str] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    revalidated: int = 0
+    stored: int = 0
+    evicted: int = 0
+
+    def __str__(self) -> str:
+        return (f"{self.hits} hits, {self.revalidated} revalidated, {self.misses} misses, "
+                f"{self.stored} stored, {self.evicted} evicted")
+
+
+@dataclass
+class HttpCache:
+    """
+    On-disk HTTP response cache.
+    Bodies are stored under the sha256 of the URL and request headers, next to a JSON file with the
+    metadata used for revalidation (ETag, Last-Modified) and for LRU eviction.
+
+    Parameters:
+    - path: Directory of the cache.
+    - max_size: Maximum total size (in bytes) of cached bodies, least recently used entries are evicted above it.
+    - default_ttl: Time (in seconds) for which an entry is served without revalidation.
+    - host_ttls: Per-host overrides of default_ttl.
+    """
+    path: str = HTTP_CACHE_PATH
+    max_size: int = 512 * 1024 * 1024
+    default_ttl: float = DEFAULT_TTL
+    host_ttls: Dict[str, float] = field(default_factory=lambda: dict(HOST_TTLS))
+    stats: CacheStats = field(default_factory=CacheStats)
+
+    def __post_init__(self):
+        self._lock = threading.Lock()
+        self._index: Optional[Dict[str, CacheEntry]] = None
+
+    @staticmethod
+    def make_key(url: str, headers: Optional[dict] = None) -> str:
+        headers = headers or dict()
+        normalized = "\n".join(f"{key.lower()}:{headers[key]}" for key in sorted(headers, key=str.lower))
+        return hashlib.sha256(f"{url}\n{normalized}".encode("utf-8")).hexdigest()
+
+    def ttl(self, url: str) -> float:
+        return self.host_ttls.get(get_host(url), self.default_ttl)
+
+    def _body_path(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.body")
+
+    def _meta_path(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.json")
+
+    def _load_index(self) -> Dict[str, CacheEntry]:
+        if self._index is None:
+            self._index = dict()
+            if os.path.isdir(self.path):
+                for name in os.listdir(self.path):
+                    key, ext = os.path.splitext(name)
+                    if ext != ".json":
+                        continue
+                    try:
+                        with open(self._meta_path(key), "r") as file:
+                            self._index[key] = CacheEntry(**json.load(file))
+                    except (OSError, ValueError, TypeError):
+                        continue
+        return self._index
+
+    def _write_meta(self, key: str, entry: CacheEntry):
+        tmp_path = self._meta_path(key) + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(entry.__dict__, file)
+        os.replace(tmp_path, self._meta_path(key))
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._load_index().get(key)
+            if entry is not None and not os.path.exists(self._body_path(key)):
+                self._index.pop(key)
+                entry = None
+            return entry
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return time.time() - entry.fetched_at < self.ttl(entry.url)
+
+    def read_body(self, key: str) -> bytes:
+        with self._lock:
+            entry = self._load_index()[key]
+            entry.last_access = time.time()
+            self._write_meta(key, entry)
+        with open(self._body_path(key), "rb") as file:
+            return file.read()
+
+    def count(self, counter: str):
+        """
+        Increments a counter of the stats (hits, misses or revalidated), fetches may run in several threads.
+        """
+        with self._lock:
+            setattr(self.stats, counter, getattr(self.stats, counter) + 1)
+
+    def conditional_headers(self, entry: CacheEntry) -> dict:
+        headers = dict()
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def mark_revalidated(self, key: str):
+        with self._lock:
+            entry = self._load_index()[key]
+            entry.fetched_at = time.time()
+            self._write_meta(key, entry)
+
+    def store(self, key: str, url: str, content: bytes, encoding: Optional[str] = None,
+              etag: Optional[str] = None, last_modified: Optional[str] = None):
+        now = time.time()
+        entry = CacheEntry(url=url, fetched_at=now, last_access=now, size=len(content), encoding=encoding,
+                           etag=etag, last_modified=last_modified)
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            tmp_path = self._body_path(key) + ".tmp"
+            with open(tmp_path, "wb") as file:
+                file.write(content)
+            os.replace(tmp_path, self._body_path(key))
+            self._write_meta(key, entry)
+            self._load_index()[key] = entry
+            self.stats.stored += 1
+            self._evict()
+
+    def _evict(self):
+        index = self._load_index()
+        total_size = sum(entry.size for entry in index.values())
+        if total_size <= self.max_size:
+            return
+
+        for key, entry in sorted(index.items(), key=lambda item: item[1].last_access):
+            if total_size <= self.max_size:
+                break
+            for path in (self._body_path(key), self._meta_path(key)):
+                if os.path.exists(path):
+                    os.remove(path)
+            index.pop(key)
+            total_size -= entry.size
+            self.stats.evicted += 1
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._load_index().keys()):
+                for path in (self._body_path(key), self._meta_path(key)):
+                    if os.path.exists(path):
+                        os.remove(path)
+            self._index = dict()
+
+
+_cache: Optional[HttpCache] = HttpCache()
+
+
+def get_cache() -> Optional[HttpCache]:
+    return _cache
+
+
+def configure_cache(cache: Optional[HttpCache]):
+    """
+    Replaces the cache used by html_utils. Passing None disables caching.
+    """
+    global _cache
+    _cache = cache
+
+
+def print_cache_stats():
+    if _cache is not None:
+        print(f"HTTP cache: {_cache.stats}")
@@ -0,0 +1,159 @@
+import threading
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from rate_limiter import RATE_LIMITED_STATUSES, get_limiter
+
+try:
+    import brotli  # noqa: F401 - urllib3 decodes "br" only when brotli is importable
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+
+@dataclass
+class SessionConfig:
+    """
+    Configuration of the shared HTTP session.
+
+    Parameters:
+    - pool_connections: Number of per-host connection pools kept alive.
+    - pool_maxsize: Maximum number of keep-alive connections per host.
+    - connect_timeout: Timeout (in seconds) for establishing a connection.
+    - read_timeout: Timeout (in seconds) for reading the response.
+    - retries: Number of retries for failed requests.
+    - backoff_factor: Backoff factor between retries (sleep = backoff_factor * 2 ** (retry - 1)).
+    """
+    pool_connections: int = 20
+    pool_maxsize: int = 10
+    connect_timeout: float = 10
+    read_timeout: float = 30
+    retries: int = 3
+    backoff_factor: float = 1.0
+
+    @property
+    def timeout(self) -> tuple:
+        return self.connect_timeout, self.read_timeout
+
+
+_config = SessionConfig()
+_session: Optional[requests.Session] = None
+_lock = threading.Lock()
+
+
+def _build_session(config: SessionConfig) -> requests.Session:
+    retry = Retry(
+        total=config.retries,
+        backoff_factor=config.backoff_factor,
+        status_forcelist=(500, 502, 504),
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=config.pool_connections, pool_maxsize=config.pool_maxsize,
+                          max_retries=retry)
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Accept-Encoding": ACCEPT_ENCODING, "Connection": "keep-alive"})
+    return session
+
+
+def configure_session(config: SessionConfig):
+    """
+    Replaces the shared session with a new one built from the given configuration.
+    :param config: Configuration of the session
+    """
+    global _config, _session
+    with _lock:
+        if _session is not None:
+            _session.close()
+        _config = config
+        _session = None
+
+
+def get_session() -> requests.Session:
+    """
+    Returns the shared session, creating it on first use.
+    """
+    global _session
+    with _lock:
+        if _session is None:
+            _session = _build_session(_config)
+        return _session
+
+
+def close_session():
+    global _session
+    with _lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+def http_get(url: str, headers: Optional[dict] = None, **kwargs) -> requests.Response:
+    """
+    Sends a GET request through the shared session using the configured timeouts.
+    Each request waits for a token of the per-host rate limiter, rate limited responses (429 / 503) are retried
+    after the backoff requested by the server.
+    :param url: URL to fetch
+    :param headers: Request headers
+    :return: Response object
+    """
+    kwargs.setdefault("timeout", _config.timeout)
+    host = get_host(url)
+
+    for attempt in range(_config.retries + 1):
+        limiter = get_limiter()
+        if limiter is not None:
+            limiter.acquire(host)
+
+        response = get_session().get(url, headers=headers, **kwargs)
+
+        if limiter is not None:
+            limiter.report(host, response.status_code, response.headers.get("Retry-After"))
+        if response.status_code not in RATE_LIMITED_STATUSES or limiter is None:
+            break
+
+    return response
+
+
+def get_connection_stats() -> dict:
+    """
+    Returns per-host counters of requests and opened connections of the shared session.
+    Requests served by an already opened connection are counted as reused.
+    """
+    stats = dict()
+    session = _session
+    if session is None:
+        return stats
+
+    adapters = {id(adapter): adapter for adapter in session.adapters.values()}
+    for adapter in adapters.values():
+        pools = adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = pool.host
+            entry = stats.setdefault(host, {"requests": 0, "connections": 0, "reused": 0})
+            entry["requests"] += pool.num_requests
+            entry["connections"] += pool.num_connections
+            entry["reused"] = entry["requests"] - entry["connections"]
+
+    return stats
+
+
+def print_connection_stats():
+    for host, entry in get_connection_stats().items():
+        print(f"{host}: {entry['requests']} requests, {entry['connections']} connections, "
+              f"{entry['reused']} reused")
+
+
+def get_host(url: str) -> str:
+    return urlparse(url).netloc
@@ -0,0 +1,156 @@
+import argparse
+import time
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from bonds import anti_inflation_bond_schedule
+
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+
+
+@dataclass
+class AR1Inflation:
+    """
+    Annual inflation following x_t = mean + phi * (x_t-1 - mean) + sigma * e_t with standard normal e_t.
+    """
+    mean: float = 0.035
+    phi: float = 0.6
+    sigma: float = 0.015
+    start: float = 0.035
+
+    def simulate(self, paths: int, years: int, rng: np.random.Generator) -> np.ndarray:
+        shocks = rng.standard_normal((paths, years)) * self.sigma
+        inflation = np.empty((paths, years))
+        previous = np.full(paths, self.start)
+        # recursion over years, every step is vectorized over all paths
+        for year in range(years):
+            previous = self.mean + self.phi * (previous - self.mean) + shocks[:, year]
+            inflation[:, year] = previous
+        return inflation
+
+
+@dataclass
+class BootstrapInflation:
+    """
+    Annual inflation resampled from history in blocks of consecutive years, which keeps its autocorrelation.
+    """
+    history: np.ndarray
+    block: int = 3
+
+    def simulate(self, paths: int, years: int, rng: np.random.Generator) -> np.ndarray:
+        history = np.asarray(self.history, dtype=np.float64)
+        block = min(self.block, len(history))
+        blocks = -(-years // block)
+        starts = rng.integers(0, len(history) - block + 1, size=(paths, blocks))
+        indices = (starts[:, :, None] + np.arange(block)).reshape(paths, -1)[:, :years]
+        return history[indices]
+
+
+def load_inflation_history(path: str) -> np.ndarray:
+    """
+    Loads annual inflation from a CSV file with column inflation (as decimals).
+    """
+    return pd.read_csv(path)["inflation"].to_numpy(dtype=np.float64)
+
+
+@dataclass
+class SimulationResult:
+    percentiles: Sequence[float]
+    final_value: np.ndarray
+    interest: np.ndarray
+    mean_final_value: float
+    mean_interest: float
+    paths: int
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame({"percentile": self.percentiles, "final_value": self.final_value,
+                             "interest": self.interest})
+
+
+def simulate_anti_inflation_bond(principal: float, first_year_rate: float, coupon: float, time: float, model,
+                                 n: int = 1, penalty: float = 0, paths: int = 100_000, chunk_size: int = 50_000,
+                                 inflation_floor: Optional[float] = None,
+                                 percentiles: Sequence[float] = DEFAULT_PERCENTILES, seed: Optional[int] = None
+                                 ) -> SimulationResult:
+    """
+    Evaluates an inflation indexed bond over simulated inflation paths, see bonds.anti_inflation_bond.
+    Paths are generated and evaluated in chunks, so memory is bound by chunk_size and not by the number of paths.
+
+    Parameters:
+    - principal: The initial amount of money (P).
+    - first_year_rate: The interest rate for the first year.
+    - coupon: The coupon rate (margin over inflation) for following years.
+    - time: The time the money is invested for (in years).
+    - model: Inflation model with a simulate(paths, years, rng) method, e.g. AR1Inflation or BootstrapInflation.
+    - n: The number of times interest is compounded per year.
+    - penalty: The penalty for early withdrawal.
+    - paths: Number of simulated inflation paths.
+    - chunk_size: Number of paths evaluated at once.
+    - inflation_floor: If given, inflation used for the rate is not lower than it (e.g. 0 when the rate cannot fall
+      below the margin).
+    - percentiles: Percentiles of the reported bands.
+    - seed: Seed of the random generator.
+
+    Returns:
+    - Percentile bands of the final value and of the interest earned.
+    """
+    rng = np.random.default_rng(seed)
+    years = max(int(time), 1)
+
+    final_values = np.empty(paths)
+    for start in range(0, paths, chunk_size):
+        size = min(chunk_size, paths - start)
+        inflation = model.simulate(size, years - 1, rng)
+        if inflation_floor is not None:
+            inflation = np.maximum(inflation, inflation_floor)
+        total_amounts, _ = anti_inflation_bond_schedule(principal, first_year_rate, coupon, inflation, time, n,
+                                                        penalty)
+        final_values[start:start + size] = total_amounts[:, -1]
+
+    final_value = np.percentile(final_values, percentiles)
+    return SimulationResult(percentiles, final_value, final_value - principal, float(final_values.mean()),
+                            float(final_values.mean() - principal), paths)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate an inflation indexed bond over random inflation paths.")
+    parser.add_argument("-p", "--principal", type=float, required=True, help="Initial amount of money (P)")
+    parser.add_argument("-fyr", "--first-year-rate", type=float, required=True, help="First year interest rate (as a "
+                                                                                   "decimal)")
+    parser.add_argument("-c", "--coupon", type=float, required=True, help="Coupon rate (as a decimal)")
+    parser.add_argument("-t", "--time", type=float, required=True, help="Time in years")
+    parser.add_argument("-n", "--n", type=int, default=1, help="Number of times interest is compounded per year")
+    parser.add_argument("--penalty", type=float, default=0, help="Penalty for early withdrawal")
+    parser.add_argument("-m", "--model", type=str, choices=["ar1", "bootstrap"], default="ar1",
+                        help="Inflation model")
+    parser.add_argument("--mean", type=float, default=0.035, help="Long term mean inflation of the AR(1) model")
+    parser.add_argument("--phi", type=float, default=0.6, help="Persistence of the AR(1) model")
+    parser.add_argument("--sigma", type=float, default=0.015, help="Yearly shock volatility of the AR(1) model")
+    parser.add_argument("--start", type=float, default=None, help="Current inflation, the mean by default")
+    parser.add_argument("--history", type=str, default=None,
+                        help="CSV file with annual inflation (column inflation) for the bootstrap model")
+    parser.add_argument("--block", type=int, default=3, help="Block length (in years) of the bootstrap model")
+    parser.add_argument("--floor", type=float, default=None, help="Lowest inflation used for the rate, e.g. 0")
+    parser.add_argument("--paths", type=int, default=100_000, help="Number of simulated paths")
+    parser.add_argument("--chunk-size", type=int, default=50_000, help="Number of paths evaluated at once")
+    parser.add_argument("--seed", type=int, default=None, help="Seed of the random generator")
+
+    args = parser.parse_args()
+
+    if args.model == "bootstrap":
+        if not args.history:
+            raise ValueError("The bootstrap model needs --history")
+        model = BootstrapInflation(load_inflation_history(args.history), args.block)
+    else:
+        model = AR1Inflation(args.mean, args.phi, args.sigma, args.mean if args.start is None else args.start)
+
+    start = time.perf_counter()
+    result = simulate_anti_inflation_bond(args.principal, args.first_year_rate, args.coupon, args.time, model,
+                                          args.n, args.penalty, args.paths, args.chunk_size, args.floor,
+                                          seed=args.seed)
+    print(f"Simulated {result.paths} paths in {time.perf_counter() - start:.2f}s")
+    print(result.to_frame().to_string(index=False, float_format="%.2f"))
+    print(f"Mean final value: {result.mean_final_value:.2f}, mean interest: {result.mean_interest:.2f}")
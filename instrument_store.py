@@ -0,0 +1,211 @@
+import argparse
+import glob
+import json
+import os
+import sqlite3
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional
+
+INSTRUMENTS_PATH = os.path.join("data", "instruments.sqlite")
+ISIN_PATH = os.path.join("data", "isin.json")
+ARISTOCRATS_LINKS_PATTERN = os.path.join("data", "dividends", "aristocrats_*_years_links.json")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS instruments (
+    company TEXT PRIMARY KEY,
+    isin TEXT,
+    ticker TEXT,
+    stockwatch_url TEXT
+);
+CREATE INDEX IF NOT EXISTS instruments_isin ON instruments (isin);
+CREATE INDEX IF NOT EXISTS instruments_ticker ON instruments (ticker);
+CREATE TABLE IF NOT EXISTS migrations (
+    name TEXT PRIMARY KEY
+);
+"""
+
+FIELDS = ("isin", "ticker", "stockwatch_url")
+
+
+@dataclass
+class Instrument:
+    company: str
+    isin: Optional[str] = None
+    ticker: Optional[str] = None
+    stockwatch_url: Optional[str] = None
+
+
+class InstrumentStore:
+    """
+    Indexed store of instrument metadata (company name, ISIN, ticker and stockwatch.pl URL) kept in SQLite.
+    On first use the store is filled from data/isin.json and the aristocrats links files.
+    """
+
+    def __init__(self, path: str = INSTRUMENTS_PATH, migrate: bool = True):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            connection.executescript(SCHEMA)
+        if migrate:
+            self.migrate_from_json()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, company: str) -> Optional[Instrument]:
+        connection = self._connect()
+        try:
+            row = connection.execute("SELECT company, isin, ticker, stockwatch_url FROM instruments WHERE company = ?",
+                                     (company,)).fetchone()
+        finally:
+            connection.close()
+        return Instrument(*row) if row else None
+
+    def find_by_isin(self, isin: str) -> Optional[Instrument]:
+        connection = self._connect()
+        try:
+            row = connection.execute("SELECT company, isin, ticker, stockwatch_url FROM instruments WHERE isin = ?",
+                                     (isin,)).fetchone()
+        finally:
+            connection.close()
+        return Instrument(*row) if row else None
+
+    def find_by_ticker(self, ticker: str) -> Optional[Instrument]:
+        connection = self._connect()
+        try:
+            row = connection.execute("SELECT company, isin, ticker, stockwatch_url FROM instruments WHERE ticker = ?",
+                                     (ticker.upper(),)).fetchone()
+        finally:
+            connection.close()
+        return Instrument(*row) if row else None
+
+    def companies(self) -> List[str]:
+        connection = self._connect()
+        try:
+            return [row[0] for row in connection.execute("SELECT company FROM instruments ORDER BY company")]
+        finally:
+            connection.close()
+
+    def upsert(self, company: str, isin: Optional[str] = None, ticker: Optional[str] = None,
+               stockwatch_url: Optional[str] = None, overwrite: bool = False):
+        """
+        Inserts or updates a single instrument atomically. Fields given as None are left untouched.
+        :param company: Name of the company
+        :param ticker: Exchange ticker, stored upper case
+        :param overwrite: If False, raises RuntimeError when a given field is already set to a different value
+        """
+        ticker = ticker.upper() if ticker else ticker
+        values = {"isin": isin, "ticker": ticker, "stockwatch_url": stockwatch_url}
+        connection = self._connect()
+        try:
+            with connection:
+                # BEGIN IMMEDIATE takes the write lock before reading, so concurrent writers cannot interleave
+                connection.execute("BEGIN IMMEDIATE")
+                row = connection.execute("SELECT isin, ticker, stockwatch_url FROM instruments WHERE company = ?",
+                                         (company,)).fetchone()
+                if row is not None and not overwrite:
+                    for field, current in zip(FIELDS, row):
+                        if values[field] is not None and current is not None and current != values[field]:
+                            raise RuntimeError(f"{field} for {company} already exists in {self.path}")
+
+                connection.execute(
+                    "INSERT INTO instruments (company, isin, ticker, stockwatch_url) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(company) DO UPDATE SET "
+                    "isin = COALESCE(excluded.isin, isin), ticker = COALESCE(excluded.ticker, ticker), "
+                    "stockwatch_url = COALESCE(excluded.stockwatch_url, stockwatch_url)",
+                    (company, isin, ticker, stockwatch_url))
+        finally:
+            connection.close()
+        _cached_instrument.cache_clear()
+
+    def migrate_from_json(self, isin_path: str = ISIN_PATH, links_pattern: str = ARISTOCRATS_LINKS_PATTERN):
+        """
+        Imports data/isin.json and the aristocrats links files once.
+        Neither of them has tickers (the keys of the links files are stockwatch.pl names), tickers are set by upsert.
+        """
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute("BEGIN IMMEDIATE")
+                if connection.execute("SELECT 1 FROM migrations WHERE name = 'json'").fetchone():
+                    return
+
+                if os.path.exists(isin_path):
+                    with open(isin_path, "r") as file:
+                        isin_data = json.load(file)
+                    connection.executemany("INSERT INTO instruments (company, isin) VALUES (?, ?) "
+                                           "ON CONFLICT(company) DO UPDATE SET isin = COALESCE(isin, excluded.isin)",
+                                           isin_data.items())
+
+                for links_path in sorted(glob.glob(links_pattern)):
+                    with open(links_path, "r") as file:
+                        links = json.load(file)
+                    connection.executemany(
+                        "INSERT INTO instruments (company, stockwatch_url) VALUES (?, ?) ON CONFLICT(company) "
+                        "DO UPDATE SET stockwatch_url = COALESCE(stockwatch_url, excluded.stockwatch_url)",
+                        links.items())
+
+                connection.execute("INSERT INTO migrations (name) VALUES ('json')")
+        finally:
+            connection.close()
+        _cached_instrument.cache_clear()
+
+
+_store: Optional[InstrumentStore] = None
+
+
+def get_store() -> InstrumentStore:
+    global _store
+    if _store is None:
+        _store = InstrumentStore()
+    return _store
+
+
+@lru_cache(maxsize=None)
+def _cached_instrument(company: str) -> Instrument:
+    instrument = get_store().get(company)
+    if instrument is None:
+        # exceptions are not cached, so companies added later are found
+        raise ValueError(f"{company} not found in {get_store().path}")
+    return instrument
+
+
+def get_instrument(company: str) -> Instrument:
+    """
+    Returns metadata of the company, cached in-process.
+    """
+    return _cached_instrument(company)
+
+
+def get_isin_of_company(company_name: str) -> str:
+    isin = get_instrument(company_name).isin
+    if not isin:
+        raise ValueError(f"ISIN for {company_name} not found in {get_store().path}")
+    return isin
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Look up instrument metadata")
+    lookup = parser.add_mutually_exclusive_group(required=True)
+    lookup.add_argument("-c", "--company", type=str, help="Company name")
+    lookup.add_argument("-i", "--isin", type=str, help="ISIN")
+    lookup.add_argument("-t", "--ticker", type=str, help="Exchange ticker")
+    parser.add_argument("--set-ticker", type=str, default=None, help="Save the ticker of the company given by -c")
+
+    args = parser.parse_args()
+
+    if args.set_ticker:
+        if not args.company:
+            raise ValueError("--set-ticker needs the company given by -c")
+        get_store().upsert(args.company, ticker=args.set_ticker)
+
+    if args.company:
+        print(get_instrument(args.company))
+    else:
+        instrument = get_store().find_by_isin(args.isin) if args.isin else get_store().find_by_ticker(args.ticker)
+        if instrument is None:
+            raise ValueError(f"{args.isin or args.ticker} not found in {get_store().path}")
+        print(instrument)
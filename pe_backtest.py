@@ -0,0 +1,155 @@
+import argparse
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from snp500pe import HysteresisLoop, PEHistory, PERatioGetter
+
+PERIODS_PER_YEAR = 12
+
+
+@dataclass
+class BacktestResult:
+    dates: np.ndarray
+    pes: np.ndarray
+    non_stock_part: np.ndarray
+    turnover: np.ndarray
+    stats: Dict[str, float] = field(default_factory=dict)
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame({"date": self.dates, "pe": self.pes, "non_stock_part": self.non_stock_part,
+                             "turnover": self.turnover})
+
+
+def monthly_history(history: PEHistory) -> PEHistory:
+    """
+    Keeps only the entries dated on the first day of a month (drops the partial current month).
+    """
+    positions = history.month_index[history.month_index >= 0]
+    return PEHistory(history.dates[positions], history.pes[positions])
+
+
+def allocation_path(history: PEHistory, loop: HysteresisLoop) -> np.ndarray:
+    """
+    Walks the history through the strategy of the loop (see HysteresisLoop.non_stock_path), holding the non-stock
+    part reached in the previous month. The history is set as the history of the loop.
+    :param history: PE history, see monthly_history
+    :param loop: Hysteresis loop of the strategy
+    :return: Non-stock part (in percent) of each month, NaN for the first months without enough history for the trend
+    """
+    loop.history = history
+    return loop.non_stock_path()
+
+
+def summary_stats(pes: np.ndarray, non_stock_part: np.ndarray, turnover: np.ndarray,
+                  returns: Optional[np.ndarray] = None, cash_return: float = 0.0) -> Dict[str, float]:
+    """
+    :param returns: Monthly stock returns (as decimals) aligned with pes, NaN where unknown
+    :param cash_return: Monthly return of the non-stock part (as a decimal)
+    """
+    years = len(pes) / PERIODS_PER_YEAR
+    stock_part = 1 - non_stock_part / 100
+    stats = {
+        "years": years,
+        "mean_non_stock_part": float(non_stock_part.mean()),
+        "turnover_per_year": float(turnover.sum() / years),
+        "rebalances": int(np.count_nonzero(turnover > 1e-9)),
+        # earnings yield of the stock part, a valuation measure of what the strategy held
+        "stock_earnings_yield": float(np.mean(stock_part / pes)),
+        "buy_and_hold_earnings_yield": float(np.mean(1 / pes)),
+    }
+
+    if returns is not None:
+        # allocation decided at the end of the previous month
+        held = np.concatenate([[stock_part[0]], stock_part[:-1]])
+        strategy = held * returns + (1 - held) * cash_return
+        known = ~np.isnan(strategy)
+        strategy = strategy[known]
+        wealth = np.cumprod(1 + strategy)
+        stats["annual_return"] = float(wealth[-1] ** (PERIODS_PER_YEAR / len(strategy)) - 1)
+        stats["annual_volatility"] = float(strategy.std() * np.sqrt(PERIODS_PER_YEAR))
+        stats["max_drawdown"] = float(np.max(1 - wealth / np.maximum.accumulate(wealth)))
+        stats["buy_and_hold_annual_return"] = float(np.prod(1 + returns[known]) ** (PERIODS_PER_YEAR / len(strategy)) - 1)
+
+    return stats
+
+
+def backtest(history: PEHistory, loop: HysteresisLoop, returns: Optional[np.ndarray] = None,
+             cash_return: float = 0.0) -> BacktestResult:
+    """
+    Runs the hysteresis allocation over the whole monthly PE history.
+    The first slope_estim_dates_num + 1 months only estimate the trend and are not backtested.
+    :param history: PE history, see monthly_history
+    :param loop: Hysteresis loop of the strategy
+    :param returns: Optional monthly stock returns (as decimals) aligned with the history, see align_returns
+    :param cash_return: Monthly return of the non-stock part (as a decimal)
+    :return: Allocation series, turnover and summary statistics
+    """
+    non_stock_part = allocation_path(history, loop)
+    known = ~np.isnan(non_stock_part)
+    if not known.any():
+        raise ValueError(f"PE history of {len(history)} months is too short to estimate the trend.")
+    dates, pes, non_stock_part = history.dates[known], history.pes[known], non_stock_part[known]
+    turnover = np.abs(np.diff(non_stock_part, prepend=non_stock_part[0])) / 100
+
+    if returns is not None:
+        returns = returns[known]
+        if np.isnan(returns).all():
+            raise ValueError(f"No returns in the backtested months from {dates[0]} to {dates[-1]}.")
+
+    stats = summary_stats(pes, non_stock_part, turnover, returns, cash_return)
+    return BacktestResult(dates, pes, non_stock_part, turnover, stats)
+
+
+def align_returns(history: PEHistory, returns: pd.Series) -> np.ndarray:
+    """
+    Aligns monthly returns with the history by month, so returns dated on any day of the month (e.g. month ends)
+    belong to the entry of that month.
+    :param returns: Monthly stock returns (as decimals) indexed by dates
+    :return: Returns aligned with the history, NaN where unknown
+    """
+    by_month = pd.Series(returns.to_numpy(dtype=np.float64), index=returns.index.to_period("M"))
+    if by_month.index.duplicated().any():
+        raise ValueError("Returns have to be monthly, some months have more than one return.")
+
+    aligned = by_month.reindex(pd.DatetimeIndex(history.dates).to_period("M")).to_numpy(dtype=np.float64)
+    if np.isnan(aligned).all():
+        raise ValueError(f"Returns from {by_month.index.min()} to {by_month.index.max()} do not overlap the PE history "
+                         f"from {history.dates[0]} to {history.dates[-1]}.")
+    return aligned
+
+
+def load_returns(path: str) -> pd.Series:
+    """
+    Loads monthly returns from a CSV file with columns date and return (as decimals).
+    """
+    df = pd.read_csv(path, parse_dates=["date"])
+    return df.set_index("date")["return"].astype(float)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest the PE hysteresis allocation on the S&P 500 PE history")
+    parser.add_argument("-xr", "--x0-rise", type=float, default=29, help="Midpoint of the rising sigmoid")
+    parser.add_argument("-xf", "--x0-fall", type=float, default=21, help="Midpoint of the falling sigmoid")
+    parser.add_argument("-k", "--k", type=float, default=0.5, help="Slope of the sigmoids")
+    parser.add_argument("-r", "--returns", type=str, default=None,
+                        help="Optional CSV file with monthly stock returns (columns date, return)")
+    parser.add_argument("-cr", "--cash-return", type=float, default=0.0,
+                        help="Monthly return of the non-stock part (as a decimal)")
+    parser.add_argument("-o", "--output", type=str, default=None, help="CSV file for the allocation series")
+
+    args = parser.parse_args()
+
+    loop = HysteresisLoop(args.x0_rise, args.x0_fall, slope=args.k)
+    history = monthly_history(PERatioGetter().get_pe_history())
+    returns = align_returns(history, load_returns(args.returns)) if args.returns else None
+
+    result = backtest(history, loop, returns, args.cash_return)
+    for name, value in result.stats.items():
+        print(f"{name}: {value:.4f}")
+
+    if args.output:
+        result.to_frame().to_csv(args.output, index=False)
+        print(f"Saved allocation series to {args.output}")
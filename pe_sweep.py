@@ -0,0 +1,213 @@
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+from pe_backtest import align_returns, backtest, load_returns, monthly_history
+from snp500pe import DEFAULT_SLOPE_ESTIM_DATES_NUM, HysteresisLoop, PEHistory, PERatioGetter
+
+SWEEP_RESULTS_PATH = os.path.join("data", "pe_sweep.csv")
+DEFAULT_OBJECTIVES = "stock_earnings_yield:max,turnover_per_year:min"
+CHUNK_SIZE = 256
+
+# history attached by each worker as views of the shared memory block
+_shared_memory: Optional[SharedMemory] = None
+_pe_history: Optional[PEHistory] = None
+_returns: Optional[np.ndarray] = None
+
+
+def _shared_layout(arrays: Dict[str, np.ndarray]) -> Dict[str, Tuple[str, Tuple[int, ...], int]]:
+    """
+    Places the arrays one after another in a single block.
+    :return: Dtype, shape and byte offset of every array
+    """
+    layout, offset = dict(), 0
+    for name, array in arrays.items():
+        layout[name] = (array.dtype.str, array.shape, offset)
+        offset += array.nbytes
+    return layout
+
+
+def _shared_views(buffer, layout: Dict[str, Tuple[str, Tuple[int, ...], int]]) -> Dict[str, np.ndarray]:
+    return {name: np.ndarray(shape, dtype=dtype, buffer=buffer, offset=offset)
+            for name, (dtype, shape, offset) in layout.items()}
+
+
+def _fill_shared(buffer, layout: Dict[str, Tuple[str, Tuple[int, ...], int]], arrays: Dict[str, np.ndarray]):
+    # the views must not outlive the call, the block cannot be closed while they exist
+    for name, view in _shared_views(buffer, layout).items():
+        view[...] = arrays[name]
+
+
+def _init_worker(name: str, layout: Dict[str, Tuple[str, Tuple[int, ...], int]], first_month: int, points: int):
+    global _shared_memory, _pe_history, _returns
+    _shared_memory = SharedMemory(name=name)
+    views = _shared_views(_shared_memory.buf, layout)
+    # the history is sorted and its index and slopes are computed by the parent, nothing is copied
+    _pe_history = PEHistory.from_arrays(views["dates"], views["pes"], views["month_index"], first_month,
+                                        {points: views["slopes"]})
+    _returns = views["returns"]
+
+
+def evaluate_chunk(params: np.ndarray, cash_return: float) -> List[Dict[str, float]]:
+    """
+    Backtests parameter combinations (rows of x0_rise, x0_fall, k) on the shared history.
+    """
+    has_returns = not np.isnan(_returns).all()
+
+    rows = list()
+    for x0_rise, x0_fall, k in params:
+        result = backtest(_pe_history, HysteresisLoop(x0_rise, x0_fall, slope=k), _returns if has_returns else None,
+                          cash_return)
+        row = {"x0_rise": x0_rise, "x0_fall": x0_fall, "k": k}
+        row.update(result.stats)
+        rows.append(row)
+    return rows
+
+
+def parameter_grid(x0_rise: Tuple[float, float, float], x0_fall: Tuple[float, float, float],
+                   k: Tuple[float, float, float], samples: Optional[int] = None, seed: int = 0) -> np.ndarray:
+    """
+    Builds parameter combinations with x0_rise >= x0_fall (the rising sigmoid has to lie below the falling one).
+    :param x0_rise: Start, stop (exclusive) and step of x0_rise
+    :param x0_fall: Start, stop (exclusive) and step of x0_fall
+    :param k: Start, stop (exclusive) and step of k
+    :param samples: If given, number of valid combinations drawn uniformly from the ranges instead of the full grid
+    :param seed: Seed of the random search
+    :return: Array of rows x0_rise, x0_fall, k
+    """
+    if samples is None:
+        grid = np.stack(np.meshgrid(np.arange(*x0_rise), np.arange(*x0_fall), np.arange(*k), indexing="ij"), axis=-1)
+        params = grid.reshape(-1, 3)
+        return params[params[:, 0] >= params[:, 1]]
+
+    if x0_rise[1] <= x0_fall[0]:
+        raise ValueError("Ranges of x0_rise and x0_fall do not allow x0_rise >= x0_fall.")
+    rng = np.random.default_rng(seed)
+    lows, highs = np.array([x0_rise[0], x0_fall[0], k[0]]), np.array([x0_rise[1], x0_fall[1], k[1]])
+    params = np.empty((0, 3))
+    # invalid draws are rejected, draw again until enough remain
+    while len(params) < samples:
+        drawn = rng.uniform(lows, highs, size=(samples, 3))
+        params = np.concatenate([params, drawn[drawn[:, 0] >= drawn[:, 1]]])
+    return params[:samples]
+
+
+def parse_objectives(text: str) -> Dict[str, str]:
+    objectives = dict()
+    for item in text.split(","):
+        name, direction = item.split(":")
+        if direction not in ("max", "min"):
+            raise ValueError(f"Objective direction has to be max or min, got {direction}")
+        objectives[name] = direction
+    return objectives
+
+
+def pareto_front(df: pd.DataFrame, objectives: Dict[str, str]) -> pd.DataFrame:
+    """
+    Returns rows not dominated by any other row.
+    :param objectives: Column names with direction, max or min
+    """
+    if df.empty:
+        return df
+    values = np.column_stack([df[name].to_numpy(dtype=np.float64) * (1 if direction == "max" else -1)
+                              for name, direction in objectives.items()])
+    at_least = (values[:, None, :] >= values[None, :, :]).all(axis=2)
+    better = (values[:, None, :] > values[None, :, :]).any(axis=2)
+    dominated = (at_least & better).any(axis=0)
+    return df[~dominated]
+
+
+def run_sweep(history: PEHistory, params: np.ndarray, output: str = SWEEP_RESULTS_PATH,
+              returns: Optional[np.ndarray] = None, cash_return: float = 0.0,
+              objectives: Optional[Dict[str, str]] = None, workers: Optional[int] = None) -> pd.DataFrame:
+    """
+    Evaluates parameter combinations in a process pool.
+    The history, its month index and PE slopes are placed in shared memory once, workers only attach views of them.
+    Results are appended to the output CSV as chunks finish and only the current frontier is kept in memory.
+    :param history: Monthly PE history, see pe_backtest.monthly_history
+    :param params: Rows of x0_rise, x0_fall, k, see parameter_grid
+    :param output: CSV file of the results
+    :param returns: Optional monthly stock returns aligned with the history, see pe_backtest.align_returns
+    :param cash_return: Monthly return of the non-stock part
+    :param objectives: Objectives of the frontier, see parse_objectives
+    :param workers: Number of worker processes, number of CPUs if None
+    :return: Pareto frontier of the evaluated combinations
+    """
+    objectives = objectives or parse_objectives(DEFAULT_OBJECTIVES)
+    points = DEFAULT_SLOPE_ESTIM_DATES_NUM + 1
+    arrays = {"dates": history.dates, "pes": history.pes, "month_index": history.month_index,
+              "slopes": history.rolling_slopes(points),
+              "returns": np.asarray(returns, dtype=np.float64) if returns is not None else np.full(len(history), np.nan)}
+    layout = _shared_layout(arrays)
+
+    directory = os.path.dirname(output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    shared_memory = SharedMemory(create=True, size=sum(array.nbytes for array in arrays.values()))
+    frontier = pd.DataFrame()
+    try:
+        _fill_shared(shared_memory.buf, layout, arrays)
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(shared_memory.name, layout, history.first_month, points)) as executor, \
+                open(output, "w", newline="") as file:
+            futures = [executor.submit(evaluate_chunk, params[start:start + CHUNK_SIZE], cash_return)
+                       for start in range(0, len(params), CHUNK_SIZE)]
+            writer = None
+            for future in tqdm(as_completed(futures), total=len(futures)):
+                rows = future.result()
+                if writer is None:
+                    writer = csv.DictWriter(file, fieldnames=list(rows[0].keys()))
+                    writer.writeheader()
+                writer.writerows({name: f"{value:.6g}" for name, value in row.items()} for row in rows)
+                frontier = pareto_front(pd.concat([frontier, pd.DataFrame(rows)], ignore_index=True), objectives)
+    finally:
+        shared_memory.close()
+        shared_memory.unlink()
+
+    first = list(objectives)[0]
+    return frontier.sort_values(first, ascending=objectives[first] == "min").reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep hysteresis sigmoid parameters over the S&P 500 PE history")
+    parser.add_argument("-xr", "--x0-rise", type=float, nargs=3, default=[20, 36, 1],
+                        help="Start, stop and step of x0_rise")
+    parser.add_argument("-xf", "--x0-fall", type=float, nargs=3, default=[12, 28, 1],
+                        help="Start, stop and step of x0_fall")
+    parser.add_argument("-k", "--k", type=float, nargs=3, default=[0.1, 1.5, 0.1], help="Start, stop and step of k")
+    parser.add_argument("-n", "--samples", type=int, default=None,
+                        help="Random search with this number of samples instead of the full grid")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random search")
+    parser.add_argument("-r", "--returns", type=str, default=None,
+                        help="Optional CSV file with monthly stock returns (columns date, return)")
+    parser.add_argument("-cr", "--cash-return", type=float, default=0.0,
+                        help="Monthly return of the non-stock part (as a decimal)")
+    parser.add_argument("--objectives", type=str, default=DEFAULT_OBJECTIVES,
+                        help="Frontier objectives as name:max|min separated by commas")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Number of worker processes, CPUs by default")
+    parser.add_argument("-o", "--output", type=str, default=SWEEP_RESULTS_PATH, help="CSV file of the results")
+
+    args = parser.parse_args()
+
+    history = monthly_history(PERatioGetter().get_pe_history())
+    returns = align_returns(history, load_returns(args.returns)) if args.returns else None
+
+    params = parameter_grid(tuple(args.x0_rise), tuple(args.x0_fall), tuple(args.k), args.samples, args.seed)
+    print(f"Evaluating {len(params)} parameter combinations")
+
+    start = time.perf_counter()
+    frontier = run_sweep(history, params, args.output, returns, args.cash_return,
+                         parse_objectives(args.objectives), args.workers)
+    print(f"Evaluated in {time.perf_counter() - start:.1f}s, results saved to {args.output}")
+    print("Frontier:")
+    print(frontier.to_string(index=False, float_format="%.4f"))
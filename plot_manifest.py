@@ -0,0 +1,74 @@
+import hashlib
+import json
+import os
+from typing import Dict, Optional
+
+import matplotlib
+
+from dividend_tools import BASE_COMPANIES_PATH, BASE_COMPANIES_RESULTS_PATH
+
+MANIFEST_FILE = "_manifest.json"
+
+# bump when the plotting code changes, so all plots are rendered again
+PLOT_RENDER_VERSION = 1
+
+
+def render_params() -> Dict[str, str]:
+    return {"render_version": str(PLOT_RENDER_VERSION), "matplotlib": matplotlib.__version__}
+
+
+def _file_digest(path: str) -> Optional[str]:
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def input_hash(company: str, companies_path: str = BASE_COMPANIES_PATH,
+               results_path: str = BASE_COMPANIES_RESULTS_PATH) -> str:
+    """
+    Hash of everything the plot of the company depends on: its dividends and results CSV files (a missing results
+    file is part of the hash too) and the rendering parameters.
+    """
+    inputs = {
+        "dividends": _file_digest(os.path.join(companies_path, f"{company}.csv")),
+        "results": _file_digest(os.path.join(results_path, f"{company}.csv")),
+        "params": render_params(),
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class PlotManifest:
+    """
+    Content hashes of the inputs of rendered plots, stored next to the plots.
+    A plot is stale when the hash of its inputs differs from the recorded one or the plot file is missing.
+    """
+
+    def __init__(self, plots_path: str):
+        self.plots_path = plots_path
+        self.path = os.path.join(plots_path, MANIFEST_FILE)
+        self.entries = self._load()
+
+    def _load(self) -> Dict[str, Dict[str, str]]:
+        if not os.path.exists(self.path):
+            return dict()
+        with open(self.path, "r") as file:
+            return json.load(file)
+
+    def save(self):
+        os.makedirs(self.plots_path, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(self.entries, file, indent=4, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def is_fresh(self, company: str, hash_value: str) -> bool:
+        entry = self.entries.get(company)
+        return entry is not None and entry["inputs"] == hash_value and os.path.exists(entry["plot"])
+
+    def record(self, company: str, hash_value: str, plot_path: str):
+        self.entries[company] = {"inputs": hash_value, "plot": plot_path}
+
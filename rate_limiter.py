@@ -0,0 +1,175 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows, limits are then shared only between threads
+    fcntl = None
+
+RATE_LIMITS_PATH = os.path.join("data", "rate_limits")
+
+RATE_LIMITED_STATUSES = (429, 503)
+
+
+@dataclass
+class HostLimit:
+    """
+    Token bucket parameters of a single host.
+
+    Parameters:
+    - rate: Number of requests per second added to the bucket.
+    - capacity: Maximum number of tokens (burst size).
+    """
+    rate: float = 0.5
+    capacity: float = 2
+
+
+HOST_LIMITS = {
+    "www.stockwatch.pl": HostLimit(rate=1 / 3, capacity=2),
+    "strefainwestorow.pl": HostLimit(rate=1 / 3, capacity=2),
+    "www.gpw.pl": HostLimit(rate=0.5, capacity=2),
+}
+
+
+@dataclass
+class RateLimiter:
+    """
+    Per-host token bucket scheduler.
+    The bucket state is kept in a JSON file per host guarded by a lock file, so the limits are shared between
+    threads and between processes running on the same machine.
+    Rate limited responses (429 / 503) block the host for the time given by Retry-After or for an exponentially
+    growing backoff, which decays again with successful responses.
+
+    Parameters:
+    - path: Directory with the bucket state and lock files.
+    - default_limit: Limit used for hosts not present in host_limits.
+    - host_limits: Per-host limits.
+    - base_backoff: Initial backoff (in seconds) after a rate limited response.
+    - max_backoff: Maximum backoff (in seconds).
+    """
+    path: str = RATE_LIMITS_PATH
+    default_limit: HostLimit = field(default_factory=HostLimit)
+    host_limits: Dict[str, HostLimit] = field(default_factory=lambda: dict(HOST_LIMITS))
+    base_backoff: float = 5.0
+    max_backoff: float = 300.0
+
+    def __post_init__(self):
+        self._thread_lock = threading.Lock()
+
+    def limit(self, host: str) -> HostLimit:
+        return self.host_limits.get(host, self.default_limit)
+
+    def _state_path(self, host: str) -> str:
+        return os.path.join(self.path, f"{host.replace(':', '_')}.json")
+
+    @contextmanager
+    def _locked_state(self, host: str):
+        os.makedirs(self.path, exist_ok=True)
+        state_path = self._state_path(host)
+        with self._thread_lock, open(state_path + ".lock", "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                state = {"tokens": self.limit(host).capacity, "updated": time.time(), "blocked_until": 0.0,
+                         "backoff": 0.0}
+                if os.path.exists(state_path):
+                    try:
+                        with open(state_path, "r") as file:
+                            state.update(json.load(file))
+                    except ValueError:
+                        pass
+                yield state
+                tmp_path = state_path + ".tmp"
+                with open(tmp_path, "w") as file:
+                    json.dump(state, file)
+                os.replace(tmp_path, state_path)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _try_acquire(self, host: str) -> float:
+        """
+        Takes a token of the host if available.
+        :return: 0 if the token was taken, otherwise time (in seconds) to wait before trying again
+        """
+        limit = self.limit(host)
+        with self._locked_state(host) as state:
+            now = time.time()
+            state["tokens"] = min(limit.capacity, state["tokens"] + (now - state["updated"]) * limit.rate)
+            state["updated"] = now
+
+            if now < state["blocked_until"]:
+                return state["blocked_until"] - now
+            if state["tokens"] >= 1:
+                state["tokens"] -= 1
+                return 0
+            return (1 - state["tokens"]) / limit.rate
+
+    def acquire(self, host: str):
+        """
+        Blocks until a request to the host is allowed.
+        :param host: Host name
+        """
+        wait = self._try_acquire(host)
+        while wait > 0:
+            time.sleep(wait)
+            wait = self._try_acquire(host)
+
+    def report(self, host: str, status_code: int, retry_after: Optional[str] = None):
+        """
+        Updates the backoff of the host based on the status of its response.
+        :param host: Host name
+        :param status_code: HTTP status code of the response
+        :param retry_after: Value of the Retry-After header, if present
+        """
+        with self._locked_state(host) as state:
+            now = time.time()
+            if status_code in RATE_LIMITED_STATUSES:
+                state["backoff"] = min(self.max_backoff, max(self.base_backoff, state["backoff"] * 2))
+                delay = parse_retry_after(retry_after, now)
+                state["blocked_until"] = max(state["blocked_until"], now + max(delay or 0, state["backoff"]))
+                state["tokens"] = 0
+            elif state["backoff"]:
+                state["backoff"] = state["backoff"] / 2 if state["backoff"] / 2 >= self.base_backoff else 0.0
+
+
+def parse_retry_after(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """
+    Parses the Retry-After header given either in seconds or as an HTTP date.
+    :return: Delay in seconds or None if the value is missing or invalid
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    now = time.time() if now is None else now
+    return max(0.0, date.timestamp() - now)
+
+
+_limiter: Optional[RateLimiter] = RateLimiter()
+
+
+def get_limiter() -> Optional[RateLimiter]:
+    return _limiter
+
+
+def configure_limiter(limiter: Optional[RateLimiter]):
+    """
+    Replaces the limiter used by http_session. Passing None disables rate limiting.
+    """
+    global _limiter
+    _limiter = limiter
@@ -0,0 +1,112 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import List, Optional
+
+import matplotlib
+import pandas as pd
+from tqdm import tqdm
+
+from dividend_tools import BASE_COMPANIES_PATH, save_div_plots
+from plot_manifest import PlotManifest, input_hash
+
+PLOTS_PATH = os.path.join("data", "plots")
+
+
+@dataclass
+class RenderResult:
+    company: str
+    seconds: float
+    path: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def all_companies(companies_path: str = BASE_COMPANIES_PATH) -> List[str]:
+    return sorted(os.path.splitext(file_name)[0] for file_name in os.listdir(companies_path)
+                  if file_name.endswith(".csv"))
+
+
+def _init_worker():
+    # headless backend, workers never open windows
+    matplotlib.use("Agg")
+
+
+def render_company(company: str, output: str = PLOTS_PATH) -> RenderResult:
+    start = time.perf_counter()
+    try:
+        path = save_div_plots(company, output)
+    except (OSError, KeyError, ValueError, TypeError, RuntimeError) as e:
+        return RenderResult(company, time.perf_counter() - start, error=f"{type(e).__name__}: {e}")
+    return RenderResult(company, time.perf_counter() - start, path)
+
+
+def render_plots(companies: List[str], output: str = PLOTS_PATH, workers: Optional[int] = None,
+                 force: bool = False) -> List[RenderResult]:
+    """
+    Renders dividend plots of the companies in a process pool, each worker uses the Agg backend.
+    Companies whose inputs did not change since the last rendering (see PlotManifest) are skipped.
+    :param companies: Names of the companies
+    :param output: Directory of the plots
+    :param workers: Number of worker processes, number of CPUs if None, 1 renders in the current process
+    :param force: If True, renders all companies regardless of the manifest
+    :return: Results of the rendered companies in the order of companies
+    """
+    manifest = PlotManifest(output)
+    hashes = {company: input_hash(company) for company in companies}
+    to_render = [company for company in companies if force or not manifest.is_fresh(company, hashes[company])]
+    if len(to_render) < len(companies):
+        print(f"Skipping {len(companies) - len(to_render)} plots with unchanged inputs")
+
+    if workers == 1:
+        _init_worker()
+        rendered = [render_company(company, output) for company in tqdm(to_render)]
+    else:
+        rendered = list()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            futures = [executor.submit(render_company, company, output) for company in to_render]
+            for future in tqdm(as_completed(futures), total=len(futures)):
+                rendered.append(future.result())
+
+    for result in rendered:
+        if result.ok:
+            manifest.record(result.company, hashes[result.company], result.path)
+    manifest.save()
+
+    results = {result.company: result for result in rendered}
+    return [results[company] for company in to_render]
+
+
+def print_render_report(results: List[RenderResult], elapsed: float):
+    if not results:
+        print("Nothing to render")
+        return
+
+    df = pd.DataFrame([{"company": r.company, "seconds": r.seconds, "error": r.error} for r in results])
+    print(df.to_string(index=False, float_format="%.3f"))
+
+    rendered = df[df["error"].isna()]
+    print(f"Rendered {len(rendered)}/{len(df)} plots in {elapsed:.1f}s "
+          f"(mean {rendered['seconds'].mean() if len(rendered) else 0:.3f}s per plot)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render dividend plots of many companies in parallel")
+    parser.add_argument("-c", "--companies", type=str, nargs="+", default=["all"],
+                        help="Company names or 'all' for every company in data/companies")
+    parser.add_argument("-o", "--output", type=str, default=PLOTS_PATH, help="Directory of the plots")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Number of worker processes, CPUs by default")
+    parser.add_argument("-f", "--force", action="store_true", help="Render all plots, even with unchanged inputs")
+
+    args = parser.parse_args()
+
+    companies = all_companies() if args.companies == ["all"] else args.companies
+
+    start = time.perf_counter()
+    results = render_plots(companies, args.output, args.workers, args.force)
+    print_render_report(results, time.perf_counter() - start)
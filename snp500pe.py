@@ -1,6 +1,4 @@
 import argparse
-import requests
-from bs4 import BeautifulSoup
 import re
 import dateutil
 import numpy as np
@@ -10,6 +8,9 @@ from typing import List, Tuple, Optional
 from datetime import datetime
 import os
 import json
+import pandas as pd
+
+from html_utils import fetch_website_text
 
 
 @dataclass
@@ -19,12 +20,103 @@ class Sigmoid:
     min_val: float = 10
     max_val: float = 90
 
+    def value(self, x: np.ndarray) -> np.ndarray:
+        return HysteresisLoop.sigmoid(x, self.min_val, self.max_val, self.k, self.x0)
+
+    def inverse(self, y: np.ndarray) -> np.ndarray:
+        return HysteresisLoop.sigmoid_reverse(y, self.min_val, self.max_val, self.k, self.x0)
+
+
+class PEHistory:
+    """
+    Monthly PE history held in arrays, sorted by date.
+    Entries dated on the first day of a month are indexed by month number, so the entry of a month is found in O(1).
+    """
+
+    def __init__(self, dates: np.ndarray, pes: np.ndarray):
+        order = np.argsort(dates, kind="stable")
+        self.dates = np.asarray(dates, dtype="datetime64[D]")[order]
+        self.pes = np.asarray(pes, dtype=np.float64)[order]
+        self._slopes = dict()
+
+        months = self.dates.astype("datetime64[M]")
+        month_starts = np.flatnonzero(months.astype("datetime64[D]") == self.dates)
+        month_numbers = months.astype(np.int64)
+        self.first_month = int(month_numbers[0]) if len(month_numbers) else 0
+        self.month_index = np.full(int(month_numbers[-1]) - self.first_month + 1 if len(month_numbers) else 0, -1,
+                                   dtype=np.int64)
+        # reversed, so the first of duplicated entries wins
+        self.month_index[month_numbers[month_starts[::-1]] - self.first_month] = month_starts[::-1]
+
+    @classmethod
+    def from_arrays(cls, dates: np.ndarray, pes: np.ndarray, month_index: np.ndarray, first_month: int,
+                    slopes: Optional[dict] = None) -> "PEHistory":
+        """
+        Builds the history from the arrays of another one without copying them, e.g. from views of shared memory.
+        :param dates: Sorted datetime64[D] dates
+        :param pes: PE values of the dates
+        :param month_index: Month index of the history, see month_index
+        :param first_month: Month number of the first entry, see first_month
+        :param slopes: Precomputed rolling slopes by the number of points, see rolling_slopes
+        """
+        history = cls.__new__(cls)
+        history.dates, history.pes = dates, pes
+        history.month_index, history.first_month = month_index, first_month
+        history._slopes = dict(slopes or dict())
+        return history
+
+    @classmethod
+    def from_pairs(cls, data: List[Tuple[datetime, float]]) -> "PEHistory":
+        return cls(np.array([entry[0] for entry in data], dtype="datetime64[D]"),
+                   np.array([entry[1] for entry in data], dtype=np.float64))
+
+    def __len__(self) -> int:
+        return len(self.pes)
+
+    def previous_index(self, dates: np.ndarray) -> np.ndarray:
+        """
+        Index of the last entry known before each date: the entry of the first day of its month, or the one of the
+        previous month when the date is the first day of a month. -1 for months missing in the history.
+        """
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        months = dates.astype("datetime64[M]")
+        positions = months.astype(np.int64) - self.first_month
+        known = (positions >= 0) & (positions < len(self.month_index))
+
+        idx = np.full(dates.shape, -1, dtype=np.int64)
+        idx[known] = self.month_index[positions[known]]
+        month_begin = months.astype("datetime64[D]") == dates
+        idx[(idx >= 0) & month_begin] -= 1
+        return idx
+
+    def rolling_slopes(self, points: int) -> np.ndarray:
+        """
+        Least squares slopes of the PE over the last points entries (inclusive) ending at each entry,
+        NaN where the history is shorter. Computed once per number of points.
+        """
+        if points in self._slopes:
+            return self._slopes[points]
+        slopes = np.full(len(self.pes), np.nan)
+        if len(self.pes) >= points:
+            x = np.arange(points) - (points - 1) / 2
+            windows = np.lib.stride_tricks.sliding_window_view(self.pes, points)
+            slopes[points - 1:] = windows @ x / (x @ x)
+        self._slopes[points] = slopes
+        return slopes
+
+
+DEFAULT_SLOPE_ESTIM_DATES_NUM = 5
+
+
 class HysteresisLoop:
     def __init__(self, x0_rise: float, x0_fall: float, slope: float = 0.5):
         self.rising_sigmoid = Sigmoid(x0=x0_rise, k=slope)
         self.falling_sigmoid = Sigmoid(x0=x0_fall, k=slope)
         self._historical_data = None
-        self.slope_estim_dates_num = 5
+        self._history: Optional[PEHistory] = None
+        self._slopes: Optional[np.ndarray] = None
+        self._slopes_points = None
+        self.slope_estim_dates_num = DEFAULT_SLOPE_ESTIM_DATES_NUM
 
     @property
     def historical_data(self):
@@ -41,6 +133,28 @@ class HysteresisLoop:
         # Sort the data by date
         sorted_data = sorted(data, key=lambda x: x[0], reverse=False)
         self._historical_data = sorted_data
+        self.history = PEHistory.from_pairs(sorted_data)
+
+    @property
+    def history(self) -> Optional[PEHistory]:
+        return self._history
+
+    @history.setter
+    def history(self, history: PEHistory):
+        self._history = history
+        self._slopes = None
+
+    def slopes(self) -> np.ndarray:
+        """
+        Rolling PE slopes of the history, computed once per history and slope_estim_dates_num.
+        """
+        if self._history is None:
+            raise ValueError("Historical data is not set.")
+        points = self.slope_estim_dates_num + 1
+        if self._slopes is None or self._slopes_points != points:
+            self._slopes = self._history.rolling_slopes(points)
+            self._slopes_points = points
+        return self._slopes
 
     @classmethod
     def sigmoid(cls, x: np.ndarray, min_val: float, max_val: float, k: float, x0: float):
@@ -121,64 +235,98 @@ class HysteresisLoop:
         else:
             return self.falling_sigmoid
 
+    def apply_trend_rule(self, pe: np.ndarray, previous_pe: np.ndarray, rising_trend: np.ndarray,
+                         held: np.ndarray) -> np.ndarray:
+        """
+        Non-stock part after a move of the PE from previous_pe to pe.
+        While the trend is rising, the rising sigmoid is followed as long as the PE grows, when the PE drops the held
+        non-stock part is kept until the PE crosses the falling sigmoid at the held value. A falling trend is
+        handled symmetrically.
+        :param held: Non-stock part held before the move
+        """
+        rise = self.rising_sigmoid
+        fall = self.falling_sigmoid
+        # PE at which the other sigmoid reaches the held non-stock part
+        with np.errstate(divide="ignore", invalid="ignore"):
+            switch_to_fall = fall.inverse(held)
+            switch_to_rise = rise.inverse(held)
+
+        return np.where(
+            rising_trend,
+            np.where(pe >= previous_pe, rise.value(pe), np.where(switch_to_fall > pe, fall.value(pe), held)),
+            np.where(pe <= previous_pe, fall.value(pe), np.where(switch_to_rise < pe, rise.value(pe), held)),
+        )
+
+    def evaluate_non_stock_parts(self, dates: np.ndarray, snp500_pes: np.ndarray) -> np.ndarray:
+        """
+        Evaluate the non-stock part for arrays of dates and snp500_pe values in one pass, see apply_trend_rule.
+        The trend is the slope of the PE over the last slope_estim_dates_num + 1 months known before the date.
+        Every date is evaluated on its own, so the held non-stock part is the one of the sigmoid of the trend at the
+        last known PE (a one month look-back), see non_stock_path for the allocation carried along the history.
+        :return: Non-stock parts, NaN for dates without enough history
+        """
+        idx = self._history.previous_index(dates)
+        slopes = self.slopes()
+        valid = idx >= 0
+        valid[valid] = ~np.isnan(slopes[idx[valid]])
+        safe_idx = np.where(valid, idx, 0)
+
+        pe = np.asarray(snp500_pes, dtype=np.float64)
+        previous_pe = self._history.pes[safe_idx]
+        rising_trend = slopes[safe_idx] > 0
+        held = np.where(rising_trend, self.rising_sigmoid.value(previous_pe), self.falling_sigmoid.value(previous_pe))
+
+        non_stock_part = self.apply_trend_rule(pe, previous_pe, rising_trend, held)
+        return np.where(valid, non_stock_part, np.nan)
+
+    def non_stock_path(self) -> np.ndarray:
+        """
+        Walks the history month by month with apply_trend_rule, holding the non-stock part actually reached in the
+        previous month. The first month with a known trend starts from the sigmoid of the trend at the previous PE,
+        as in evaluate_non_stock_parts.
+        :return: Non-stock part of every entry of the history, NaN for entries without enough history
+        """
+        pes = self._history.pes
+        slopes = self.slopes()
+        path = np.full(len(pes), np.nan)
+        if len(pes) < 2:
+            return path
+
+        # trend and both candidate values of every step, only the held value depends on the path
+        rising_trend = slopes[:-1] > 0
+        rise_values = self.rising_sigmoid.value(pes)
+        fall_values = self.falling_sigmoid.value(pes)
+        steps = np.flatnonzero(~np.isnan(slopes[:-1])) + 1
+        if not len(steps):
+            return path
+
+        first = steps[0]
+        held = rise_values[first - 1] if rising_trend[first - 1] else fall_values[first - 1]
+        # saturated held values have no crossing PE, their inverse is infinite
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for t in steps.tolist():
+                if rising_trend[t - 1]:
+                    if pes[t] >= pes[t - 1]:
+                        held = rise_values[t]
+                    elif self.falling_sigmoid.inverse(held) > pes[t]:
+                        held = fall_values[t]
+                else:
+                    if pes[t] <= pes[t - 1]:
+                        held = fall_values[t]
+                    elif self.rising_sigmoid.inverse(held) < pes[t]:
+                        held = rise_values[t]
+                path[t] = held
+        return path
+
     def evaluate_non_stock_part(self, date: datetime, snp500_pe: float) -> float:
         """
         Evaluate the non-stock part based on the date and snp500_pe value.
         """
-
-        month_begin = datetime(date.year, date.month, 1)
-        dates = [entry[0] for entry in self._historical_data]
-        pes = [entry[1] for entry in self._historical_data]
-
-        idx = dates.index(month_begin)
-        if month_begin == date:
-            idx = idx - 1
-
-        indexes = list(range(idx - self.slope_estim_dates_num, idx + 1))
-        slope, intercept = np.polyfit(np.arange(len(indexes)), np.array(pes)[indexes], 1)
-
-        # case: pe ratio is rising for whole period
-        if slope > 0 and snp500_pe > pes[idx]:
-            current_sigmoid = asdict(self.rising_sigmoid)
-            current_sigmoid["x"] = snp500_pe
-            return self.sigmoid(**current_sigmoid)
-        # case: pe ratio is rising in previous periods, but now it is falling.
-        elif slope > 0 and snp500_pe < pes[idx]:
-            current_sigmoid = asdict(self.rising_sigmoid)
-            current_sigmoid["x"] = pes[idx]
-            non_stock_part = self.sigmoid(**current_sigmoid)
-            other_sigmoid_y = asdict(self.falling_sigmoid)
-            other_sigmoid_y["y"] = non_stock_part
-            pe_to_change_to_other_sigmoid = self.sigmoid_reverse(**other_sigmoid_y)
-            # move to another sigmoid
-            if pe_to_change_to_other_sigmoid > snp500_pe:
-                other_sigmoid_x = asdict(self.falling_sigmoid)
-                other_sigmoid_x["x"] = snp500_pe
-                return self.sigmoid(**other_sigmoid_x)
-            else:
-                return non_stock_part
-        else: #TODO handle other 2 cases
-            current_sigmoid = self.falling_sigmoid
-
-
-
-        return 1
-
-def fetch_website_text(url: str) -> Optional[str]:
-
-    try:
-        # Send a GET request to the URL
-        response = requests.get(url)
-        response.raise_for_status()  # Raise an exception for HTTP errors
-
-        # Parse the HTML content using BeautifulSoup
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        # Extract and return the text content
-        return soup.get_text()
-    except requests.exceptions.RequestException as e:
-        print(f"An error occurred: {e}")
-        return None
+        non_stock_part = self.evaluate_non_stock_parts(np.array([date], dtype="datetime64[D]"),
+                                                       np.array([snp500_pe]))[0]
+        if np.isnan(non_stock_part):
+            raise ValueError(f"Not enough historical data before {date}.")
+        return float(non_stock_part)
 
 def extract_single_pe_ratio(text: str) -> Tuple[str, datetime]:
     # Regex to extract the number (P/E Ratio)
@@ -201,6 +349,10 @@ def extract_single_pe_ratio(text: str) -> Tuple[str, datetime]:
 
 
 
+PE_RECORD_DTYPE = np.dtype([("date", "<i8"), ("pe", "<f8")])
+MULTPL_DATE_FORMAT = "%b %d, %Y"
+
+
 class PERatioGetter:
     SNP500_URL = "https://worldperatio.com/index/sp-500/"
     PE_RATIO_HIST_URL = "https://www.multpl.com/s-p-500-pe-ratio/table/by-month"
@@ -210,25 +362,96 @@ class PERatioGetter:
         self.save_data = save_data
         self.data_dir = "data"
         self.data_hist_file = os.path.join(self.data_dir, "pe_ratio_hist.json")
+        # records of int64 epoch seconds and float64 PE values, derived from the JSON file
+        self.data_hist_binary_file = os.path.join(self.data_dir, "pe_ratio_hist.npy")
 
-    def get_pe_ratios(self) -> List[Tuple[str, str]]:
-        if os.path.exists(self.data_hist_file) and not self.force_fetch:
-            with open(self.data_hist_file, "r") as file:
-                data = json.load(file)
-                return self.change_to_date_float(data)
+    def get_pe_ratios(self) -> List[Tuple[datetime, float]]:
+        history = self.get_pe_history()
+        return list(zip(history.dates.astype("datetime64[s]").tolist(), history.pes.tolist()))
+
+    def get_pe_history(self) -> PEHistory:
+        """
+        Returns the PE history, refreshed from the website if force_fetch is set or nothing is stored yet.
+        """
+        records = None if self.force_fetch else self.load_records()
+        if records is None:
+            records = self.refresh()
+        return PEHistory(records["date"].astype("datetime64[s]"), records["pe"])
+
+    def load_records(self) -> Optional[np.ndarray]:
+        """
+        Loads the stored history as a memory mapped array of PE_RECORD_DTYPE records.
+        The binary file is rebuilt from the JSON file when missing or older.
+        :return: Records sorted by date or None if nothing is stored
+        """
+        binary_exists = os.path.exists(self.data_hist_binary_file)
+        json_exists = os.path.exists(self.data_hist_file)
+        if binary_exists and (not json_exists or
+                              os.path.getmtime(self.data_hist_binary_file) >= os.path.getmtime(self.data_hist_file)):
+            return np.load(self.data_hist_binary_file, mmap_mode="r")
+        if not json_exists:
+            return None
+
+        with open(self.data_hist_file, "r") as file:
+            records = self.to_records(json.load(file))
+        if self.save_data:
+            np.save(self.data_hist_binary_file, records)
+        return records
+
+    def refresh(self) -> np.ndarray:
+        """
+        Fetches the history table and merges only the months newer than the last stored full month.
+        The stored entry of the current month (dated on its last update, not on the first day) is replaced by the
+        fetched one.
+        :return: Merged records sorted by date
+        """
+        text = fetch_website_text(self.PE_RATIO_HIST_URL)
+        if not text:
+            raise ValueError(f"Failed to fetch data from the website {self.PE_RATIO_HIST_URL}")
+        fetched = self.to_records(self.extract_multiple_pe_ratios(text))
+
+        stored = self.load_records()
+        if stored is not None and len(stored):
+            stored = np.asarray(stored)
+            dates = stored["date"].astype("datetime64[s]")
+            month_starts = stored[dates.astype("datetime64[M]") == dates]
+            last_month = month_starts["date"].max() if len(month_starts) else np.iinfo(np.int64).min
+            new = fetched[fetched["date"] > last_month]
+            print(f"Merged {len(new)} new entries of the PE history")
+            records = np.sort(np.concatenate([month_starts, new]), order="date")
         else:
-            text = fetch_website_text(self.PE_RATIO_HIST_URL)
-            if text:
-                extracted_pe_ratios = self.extract_multiple_pe_ratios(text)
-            else:
-                raise ValueError(f"Failed to fetch data from the website {self.PE_RATIO_HIST_URL}")
+            records = fetched
+
+        if self.save_data:
+            os.makedirs(self.data_dir, exist_ok=True)
+            with open(self.data_hist_file, "w") as file:
+                json.dump(self.from_records(records), file)
+            np.save(self.data_hist_binary_file, records)
 
-            if self.save_data:
-                os.makedirs(self.data_dir, exist_ok=True)
-                with open(self.data_hist_file, "w") as file:
-                    json.dump(extracted_pe_ratios, file)
+        return records
 
-            return self.change_to_date_float(extracted_pe_ratios)
+    @staticmethod
+    def to_records(data: List[Tuple[str, str]]) -> np.ndarray:
+        """
+        Converts (date, value) string pairs of the multpl.com table into PE_RECORD_DTYPE records sorted by date.
+        """
+        records = np.empty(len(data), dtype=PE_RECORD_DTYPE)
+        if len(data):
+            dates, values = zip(*data)
+            records["date"] = pd.to_datetime(list(dates), format=MULTPL_DATE_FORMAT).values.astype(
+                "datetime64[s]").astype(np.int64)
+            records["pe"] = np.asarray(values, dtype=np.float64)
+        return np.sort(records, order="date")
+
+    @staticmethod
+    def from_records(records: np.ndarray) -> List[Tuple[str, str]]:
+        """
+        Converts records back into string pairs, newest first as on multpl.com.
+        """
+        pairs = list()
+        for date, value in zip(records["date"][::-1].astype("datetime64[s]").tolist(), records["pe"][::-1].tolist()):
+            pairs.append((f"{date:%b} {date.day}, {date.year}", f"{value:.2f}"))
+        return pairs
 
     @staticmethod
     def extract_multiple_pe_ratios(text: str) -> List[Tuple[datetime, float]]:
@@ -253,15 +476,8 @@ class PERatioGetter:
         """
         Convert date strings to datetime objects and values to floats.
         """
-        date_value_pairs = []
-        for date_str, value_str in data:
-            date = dateutil.parser.parse(date_str)
-            value = float(value_str)
-            date_value_pairs.append((date, value))
-        return date_value_pairs
-
-
-
+        records = PERatioGetter.to_records(data)
+        return list(zip(records["date"].astype("datetime64[s]").tolist(), records["pe"].tolist()))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,169 @@
+from typing import Dict, List, Optional, Tuple
+
+import bs4
+from bs4 import BeautifulSoup, SoupStrainer
+
+from html_utils import SELECTOLAX, get_html_parser
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+except ImportError:
+    HTMLParser = None
+
+
+def parse_tables(html: str, parser: Optional[str] = None) -> List[bs4.Tag]:
+    """
+    Parses only the <table> subtrees of the document.
+    :param html: HTML of the page
+    :param parser: BeautifulSoup parser, the globally selected one if None
+    :return: List of tables (nested tables are included separately)
+    """
+    parser = get_html_parser(parser)
+    # html5lib does not support parse_only and always builds the whole tree
+    parse_only = SoupStrainer("table") if parser != "html5lib" else None
+    soup = BeautifulSoup(html, parser, parse_only=parse_only)
+    return soup.find_all("table")
+
+
+def find_table(html: str, marker: str, parser: Optional[str] = None, last: bool = True) -> bs4.Tag:
+    """
+    Finds the table identified by the marker text.
+    The marker is looked for inside the tables first (caption, title row or header cell), when it is placed outside
+    of them (e.g. in a heading) the first table following the marker is returned.
+    :param html: HTML of the page
+    :param marker: Text identifying the table
+    :param parser: BeautifulSoup parser, the globally selected one if None
+    :param last: If True, the last occurrence of the marker wins (earlier ones are e.g. in navigation or teasers),
+    otherwise the first one
+    :return: Table element
+    """
+    # skip tables wrapping other tables, the innermost table containing the marker is the data table
+    tables = [table for table in parse_tables(html, parser)
+              if table.find("table") is None and table.find(string=lambda text: text and marker in text)]
+    if tables:
+        return tables[-1] if last else tables[0]
+
+    # marker outside of the tables, take the first table following it
+    position = html.rfind(marker) if last else html.find(marker)
+    if position >= 0:
+        tables = parse_tables(html[position:], parser)
+        if tables:
+            return tables[0]
+
+    soup = BeautifulSoup(html, get_html_parser(parser))
+    return find_table_in_soup(soup, marker, last)
+
+
+def find_table_in_soup(soup: bs4.BeautifulSoup, marker: str, last: bool = True) -> bs4.Tag:
+    """
+    Returns the first table following the marker text, see find_table for last.
+    """
+    nodes = soup.find_all(string=lambda text: text and marker in text)
+    table = (nodes[-1] if last else nodes[0]).find_next("table") if nodes else None
+    if table is None:
+        raise RuntimeError(f"Table marked with '{marker}' not found.")
+    return table
+
+
+def _expand_colspan(cells: List[Tuple[str, Optional[str]]]) -> List[str]:
+    expanded = list()
+    for text, colspan in cells:
+        try:
+            span = int(colspan or 1)
+        except ValueError:
+            span = 1
+        expanded.extend([text] * max(span, 1))
+    return expanded
+
+
+def row_cells(row: bs4.Tag) -> List[str]:
+    """
+    Returns stripped texts of the cells of the row, cells spanning several columns are repeated.
+    """
+    return _expand_colspan([(cell.get_text(" ", strip=True), cell.get("colspan"))
+                            for cell in row.find_all(["td", "th"], recursive=False)])
+
+
+def build_rows(rows: List[List[str]], fill_headers: Optional[Dict[int, str]] = None) -> Tuple[List[str], List[List[str]]]:
+    """
+    Splits the rows of a table into the header and data rows.
+    The header is the first row, all following rows are data rows.
+    :param rows: Cell texts of rows with more than one cell (single cell rows are titles)
+    :param fill_headers: Names of header columns by position, used for empty header cells or inserted when the header
+    is shorter than the data rows
+    :return: Headers and data rows
+    """
+    if not rows:
+        raise RuntimeError("Table has no rows.")
+
+    headers, data = rows[0], rows[1:]
+    width = max((len(row) for row in data), default=len(headers))
+
+    for idx, name in sorted((fill_headers or dict()).items()):
+        if len(headers) < width:
+            headers.insert(idx, name)
+        elif idx < len(headers) and not headers[idx]:
+            headers[idx] = name
+
+    if any(len(row) > len(headers) for row in data):
+        raise RuntimeError(f"Table rows are wider than its header {headers}.")
+
+    data = [row + [""] * (len(headers) - len(row)) if len(row) < len(headers) else row for row in data]
+    return headers, data
+
+
+def table_to_rows(table: bs4.Tag, fill_headers: Optional[Dict[int, str]] = None) -> Tuple[List[str], List[List[str]]]:
+    """
+    Builds the header and data rows from the <tr> / <td> cells of the table.
+    :param table: Table element
+    :param fill_headers: See build_rows
+    :return: Headers and data rows
+    """
+    rows = [row_cells(row) for row in table.find_all("tr")
+            if len(row.find_all(["td", "th"], recursive=False)) > 1]
+    return build_rows(rows, fill_headers)
+
+
+def _selectolax_table_rows(html: str, marker: str, last: bool = True) -> List[List[str]]:
+    if HTMLParser is None:
+        raise ImportError("selectolax is not installed")
+
+    # css() of a node matches the node itself, innermost tables have only one match
+    tables = [node for node in HTMLParser(html).css("table")
+              if len(node.css("table")) == 1 and marker in node.text(deep=True)]
+    table = (tables[-1] if last else tables[0]) if tables else None
+
+    if table is None:
+        # marker outside of the tables, take the first table following it
+        position = html.rfind(marker) if last else html.find(marker)
+        if position >= 0:
+            table = HTMLParser(html[position:]).css_first("table")
+    if table is None:
+        raise RuntimeError(f"Table marked with '{marker}' not found.")
+
+    rows = list()
+    for row in table.css("tr"):
+        cells = [cell for cell in row.iter() if cell.tag in ("td", "th")]
+        if len(cells) > 1:
+            # same as get_text(" ", strip=True), keeps the non-breaking space thousands separators
+            rows.append(_expand_colspan([(cell.text(deep=True, separator=" ", strip=True),
+                                          cell.attributes.get("colspan")) for cell in cells]))
+    return rows
+
+
+def extract_table(html: str, marker: str, fill_headers: Optional[Dict[int, str]] = None,
+                  parser: Optional[str] = None, last: bool = True) -> Tuple[List[str], List[List[str]]]:
+    """
+    Finds the table identified by the marker text and returns its header and data rows.
+    With the selectolax backend the table is extracted without building a BeautifulSoup tree.
+    :param html: HTML of the page
+    :param marker: Text identifying the table, see find_table
+    :param fill_headers: See build_rows
+    :param parser: Parser backend, the globally selected one if None
+    :param last: See find_table
+    :return: Headers and data rows
+    """
+    parser = get_html_parser(parser, allow_selectolax=True)
+    if parser == SELECTOLAX:
+        return build_rows(_selectolax_table_rows(html, marker, last), fill_headers)
+    return table_to_rows(find_table(html, marker, parser, last), fill_headers)
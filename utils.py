@@ -1,5 +1,7 @@
 from typing import Tuple, List
 
+from cash_flows import compound_schedule
+
 def calculate_compound_interest(principal: float, rate: float, time: float, n: int) -> Tuple[float, float]:
     """
     Calculate compound interest.
@@ -38,12 +40,5 @@ def calculate_compound_interest_yearly(principal: float, rate: float, time: floa
     if time < 1:
         raise ValueError("Time must be at least 1 year for yearly calculations.")
 
-    total_amounts = []
-    compound_interests = []
-
-    for year in range(1, int(time) + 1):
-        total_amount, compound_interest = calculate_compound_interest(principal, rate, year, n)
-        total_amounts.append(total_amount)
-        compound_interests.append(compound_interest)
-
-    return total_amounts, compound_interests
\ No newline at end of file
+    total_amounts, compound_interests = compound_schedule(principal, rate, time, n)
+    return total_amounts.tolist(), compound_interests.tolist()
\ No newline at end of file
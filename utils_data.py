@@ -1,5 +1,11 @@
 from typing import List, Optional
 
+import pandas as pd
+from pandas.api.types import is_numeric_dtype
+
+# numeric columns of the dividend tables scraped from stockwatch.pl (names normalized by change_column_names)
+DIVIDEND_NUMERIC_COLUMNS = ["dyw_na_akcje", "stopa"]
+
 polish_to_english = str.maketrans(
     "ąćęłńóśźżĄĆĘŁŃÓŚŹŻ",
     "acelnoszzACELNOSZZ"
@@ -18,3 +24,65 @@ def change_column_names(columns: List[str]) -> List[str]:
 
     return changed
 
+
+def to_float(val: str) -> float:
+    if isinstance(val, str):
+        val = val.replace(",", ".")
+        if "\xa0" in val:
+            val = val.replace('\xa0', "")
+        if "%" in val:
+            val = val.replace("%", "")
+            val = float(val)
+            val = val * 0.01
+        elif " (" in val:
+            val = val.split(" ")[0]
+            val = float(val)
+        else:
+            val = float(val)
+    return val
+
+
+def to_float_series(values: pd.Series, errors: str = "coerce") -> pd.Series:
+    """
+    Vectorized version of to_float converting a whole column of Polish formatted numbers at once:
+    comma decimals, non-breaking space thousands separators, percentages (scaled by 0.01) and " (...)" suffixes.
+    Numeric columns are returned unchanged.
+    :param values: Column to convert
+    :param errors: "coerce" turns invalid values into NaN, "raise" raises ValueError
+    :return: Float column
+    """
+    if is_numeric_dtype(values):
+        return values.astype(float)
+
+    text = (values.astype("string")
+                  .str.replace(r" \(.*$", "", regex=True)
+                  .str.replace(",", ".", regex=False)
+                  .str.replace("\xa0", "", regex=False))
+    percent = text.str.contains("%", regex=False).fillna(False).to_numpy(dtype=bool)
+    text = text.str.replace("%", "", regex=False).str.strip()
+
+    try:
+        numbers = text.astype(float).to_numpy(copy=True)
+    except (TypeError, ValueError):
+        # slower path handling empty and invalid values
+        numbers = pd.to_numeric(text.to_numpy(dtype=object), errors=errors).astype(float)
+    numbers[percent] *= 0.01
+    return pd.Series(numbers, index=values.index, name=values.name)
+
+
+def normalize_numeric_columns(df: pd.DataFrame, columns: Optional[List[str]] = None,
+                              exclude: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Converts columns of a scraped table to floats, so the stored files hold numeric dtypes.
+    :param df: Scraped table
+    :param columns: Normalized names (see change_column_names) of the columns to convert, all columns if None
+    :param exclude: Normalized names of the columns left untouched
+    :return: Copy of the DataFrame with converted columns
+    """
+    df = df.copy()
+    normalized = dict(zip(change_column_names(df.columns), df.columns))
+    selected = columns if columns is not None else list(normalized)
+    for name in selected:
+        if name in normalized and name not in (exclude or []):
+            df[normalized[name]] = to_float_series(df[normalized[name]])
+    return df
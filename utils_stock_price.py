@@ -1,3 +1,4 @@
+import glob
 import matplotlib.pyplot as plt
 import pandas as pd
 import os
@@ -5,19 +6,77 @@ import os
 from utils_data import change_column_names
 
 STOCK_PRICES= os.path.join("data", "stock_prices")
+STOCK_PRICES_CACHE_DIR = ".cache"
 
-def draw_stock_price_graph(company_name: str, data_path: str=STOCK_PRICES) -> None:
+try:
+    import pyarrow
+    CACHE_FORMAT = "parquet"
+except ImportError:
+    pyarrow = None
+    CACHE_FORMAT = "pkl"
+
+
+def read_stock_price_xls(path: str) -> pd.DataFrame:
     """
-    Draws a graph of the stock price data.
-    :param company_name: Name of the company
+    Reads the stock price XLS file downloaded from gpw.pl and normalizes it.
+    :param path: Path to the XLS file
+    :return: DataFrame indexed by date with numeric closing price
     """
-
-    df = pd.read_excel(os.path.join(data_path, f"{company_name}_stock_price.xls"))
+    df = pd.read_excel(path)
     df.columns = change_column_names(df.columns)
 
     df['data'] = pd.to_datetime(df['data'])
     df.set_index('data', inplace=True)
     df['kurs_zamkniecia'] = pd.to_numeric(df['kurs_zamkniecia'], errors='coerce')
+    return df
+
+
+def load_stock_prices(company_name: str, data_path: str=STOCK_PRICES) -> pd.DataFrame:
+    """
+    Loads the normalized stock prices of a company.
+    The first read of the XLS file stores a typed columnar copy (Parquet, or pickle when pyarrow is missing) keyed by the
+    modification time and size of the source file, following reads are served from it until the source changes.
+    :param company_name: Name of the company
+    :param data_path: Path to the directory where stock prices are stored
+    :return: DataFrame indexed by date with numeric closing price
+    """
+    source = os.path.join(data_path, f"{company_name}_stock_price.xls")
+    stat = os.stat(source)
+    cache_dir = os.path.join(data_path, STOCK_PRICES_CACHE_DIR)
+    cache_prefix = os.path.join(cache_dir, f"{company_name}_stock_price")
+    cache_key = f"{cache_prefix}.{stat.st_mtime_ns}_{stat.st_size}"
+
+    if os.path.exists(f"{cache_key}.parquet"):
+        return pd.read_parquet(f"{cache_key}.parquet")
+    if os.path.exists(f"{cache_key}.pkl"):
+        return pd.read_pickle(f"{cache_key}.pkl")
+
+    df = read_stock_price_xls(source)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    for stale_path in glob.glob(f"{glob.escape(cache_prefix)}.*"):
+        os.remove(stale_path)
+
+    if CACHE_FORMAT == "parquet":
+        try:
+            df.to_parquet(f"{cache_key}.parquet")
+            return df
+        except (TypeError, ValueError, pyarrow.ArrowException):
+            # columns mixing numbers and strings cannot be stored in Parquet
+            if os.path.exists(f"{cache_key}.parquet"):
+                os.remove(f"{cache_key}.parquet")
+    df.to_pickle(f"{cache_key}.pkl")
+
+    return df
+
+
+def draw_stock_price_graph(company_name: str, data_path: str=STOCK_PRICES) -> None:
+    """
+    Draws a graph of the stock price data.
+    :param company_name: Name of the company
+    """
+
+    df = load_stock_prices(company_name, data_path)
 
     plt.figure(figsize=(10, 5))
     plt.plot(df.index, df['kurs_zamkniecia'], label=company_name)
@@ -35,12 +94,7 @@ def get_stock_prices_yearly(company_name, data_path: str=STOCK_PRICES) -> pd.Dat
     :param data_path: Path to the directory where stock prices are stored
     :return: DataFrame containing the stock prices for each year
     """
-    df = pd.read_excel(os.path.join(data_path, f"{company_name}_stock_price.xls"))
-    df.columns = change_column_names(df.columns)
-
-    df['data'] = pd.to_datetime(df['data'])
-    df.set_index('data', inplace=True)
-    df['kurs_zamkniecia'] = pd.to_numeric(df['kurs_zamkniecia'], errors='coerce')
+    df = load_stock_prices(company_name, data_path)
 
     yearly_prices = df.resample('YE').last()  # Get the last price of each year
     return yearly_prices
\ No newline at end of file
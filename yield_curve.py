@@ -0,0 +1,252 @@
+import argparse
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+from ytm_bonds import calculate_ytm_batch, payment_schedule, read_bonds
+
+# Rates of the curves are continuously compounded zero rates, discount factor exp(-z(t) * t)
+DEFAULT_TAUS = np.geomspace(0.1, 30, 120)
+
+
+def cash_flow_matrix(df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Builds padded cash flow matrices of the bonds on the schedule used for their yields, see
+    ytm_bonds.payment_schedule.
+
+    Parameters:
+    - df: Bonds, see ytm_bonds.read_bonds (years_to_maturity may be fractional).
+
+    Returns:
+    - times: Times of the cash flows in years, one row per bond (0 for padding).
+    - amounts: Cash flows (0 for padding).
+    - target: Dirty market prices (price * face_value + accrued_interest).
+    """
+    maturity = df["years_to_maturity"].to_numpy(dtype=np.float64)
+    per_year = df["payments_per_year"].to_numpy(dtype=np.float64)
+    face_value = df["face_value"].to_numpy(dtype=np.float64)
+    coupon = df["coupon_rate"].to_numpy(dtype=np.float64) * face_value / per_year
+
+    payments = np.maximum(payment_schedule(maturity, per_year)[0], 1).astype(np.int64)
+    periods = np.arange(payments.max())
+    mask = periods[None, :] < payments[:, None]
+
+    times = np.where(mask, maturity[:, None] - periods[None, :] / per_year[:, None], 0.0)
+    amounts = np.where(mask, coupon[:, None], 0.0)
+    amounts[:, 0] += face_value
+
+    target = df["price"].to_numpy(dtype=np.float64) * face_value + df["accrued_interest"].to_numpy(dtype=np.float64)
+    return times, amounts, target
+
+
+def continuous_rate(ytm: np.ndarray, payments_per_year: np.ndarray) -> np.ndarray:
+    """
+    Converts yields to maturity compounded payments_per_year times a year to continuously compounded rates.
+    """
+    return payments_per_year * np.log1p(ytm / payments_per_year)
+
+
+def ns_loadings(t: np.ndarray, tau: np.ndarray) -> np.ndarray:
+    """
+    Nelson-Siegel factor loadings (level, slope, curvature) stacked on the last axis; t and tau are broadcast.
+    """
+    x = np.asarray(t, dtype=np.float64) / tau
+    small = x < 1e-8
+    safe_x = np.where(small, 1.0, x)
+    decay = np.exp(-x)
+    slope = np.where(small, 1 - x / 2, (1 - decay) / safe_x)
+    return np.stack([np.ones_like(slope), slope, slope - decay], axis=-1)
+
+
+@dataclass
+class NelsonSiegel:
+    beta0: float
+    beta1: float
+    beta2: float
+    tau: float
+    rmse: float = np.nan
+
+    def zero_rate(self, t: np.ndarray) -> np.ndarray:
+        return ns_loadings(t, self.tau) @ np.array([self.beta0, self.beta1, self.beta2])
+
+    def discount(self, t: np.ndarray) -> np.ndarray:
+        return np.exp(-self.zero_rate(t) * t)
+
+
+@dataclass
+class BootstrapCurve:
+    times: np.ndarray
+    zero_rates: np.ndarray
+
+    def zero_rate(self, t: np.ndarray) -> np.ndarray:
+        # linear in the zero rate between nodes, flat outside
+        return np.interp(t, self.times, self.zero_rates)
+
+    def discount(self, t: np.ndarray) -> np.ndarray:
+        return np.exp(-self.zero_rate(t) * t)
+
+
+def curve_prices(curve, times: np.ndarray, amounts: np.ndarray) -> np.ndarray:
+    return (amounts * curve.discount(times)).sum(axis=1)
+
+
+def fit_nelson_siegel(df: pd.DataFrame, taus: np.ndarray = DEFAULT_TAUS, iterations: int = 8) -> NelsonSiegel:
+    """
+    Fits a Nelson-Siegel zero curve to the bond prices.
+    For every tau of the grid at once, betas are first solved by linear least squares on the yields to maturity and
+    then refined by Gauss-Newton steps on the prices (relative errors). The tau with the lowest error is returned.
+
+    Parameters:
+    - df: Bonds, see ytm_bonds.read_bonds.
+    - taus: Grid of decay parameters (in years).
+    - iterations: Number of Gauss-Newton steps.
+
+    Returns:
+    - Fitted curve with the root mean squared relative price error.
+    """
+    times, amounts, target = cash_flow_matrix(df)
+    ytm = calculate_ytm_batch(*(df[column].to_numpy() for column in
+                                ["face_value", "price", "coupon_rate", "years_to_maturity", "accrued_interest",
+                                 "payments_per_year"])).ytm
+    known = ~np.isnan(ytm)
+    if known.sum() < 3:
+        raise ValueError("At least 3 bonds with a yield to maturity are needed to fit the curve.")
+    per_year = df["payments_per_year"].to_numpy(dtype=np.float64)[known]
+    times, amounts, target, ytm = times[known], amounts[known], target[known], ytm[known]
+    maturity = times[:, 0]
+
+    taus = np.asarray(taus, dtype=np.float64)
+    # initial betas: least squares on yields converted to continuous compounding, for all taus (taus, bonds, 3)
+    x = ns_loadings(maturity[None, :], taus[:, None])
+    y = continuous_rate(ytm, per_year)
+    betas = np.linalg.solve(np.einsum("tbi,tbj->tij", x, x) + 1e-12 * np.eye(3),
+                            np.einsum("tbi,b->ti", x, y)[..., None])[..., 0]
+
+    # loadings of all cash flows for all taus (taus, bonds, flows, 3)
+    loadings = ns_loadings(times[None, :, :], taus[:, None, None])
+    for _ in range(iterations):
+        zero = loadings @ betas[:, None, :, None]
+        discounted = amounts * np.exp(-zero[..., 0] * times)
+        residual = discounted.sum(axis=2) / target - 1
+        jacobian = np.einsum("tbf,tbfi->tbi", -discounted * times, loadings) / target[None, :, None]
+        step = np.linalg.solve(np.einsum("tbi,tbj->tij", jacobian, jacobian) + 1e-12 * np.eye(3),
+                               np.einsum("tbi,tb->ti", jacobian, residual)[..., None])[..., 0]
+        betas = betas - step
+
+    zero = loadings @ betas[:, None, :, None]
+    residual = (amounts * np.exp(-zero[..., 0] * times)).sum(axis=2) / target - 1
+    errors = np.sqrt(np.mean(residual ** 2, axis=1))
+    errors[~np.isfinite(errors)] = np.inf
+    best = int(np.argmin(errors))
+    return NelsonSiegel(*map(float, betas[best]), tau=float(taus[best]), rmse=float(errors[best]))
+
+
+def bootstrap(df: pd.DataFrame, max_iterations: int = 50) -> BootstrapCurve:
+    """
+    Bootstraps zero rates from the bonds ordered by maturity, one node per bond.
+    Cash flows before the last known node are discounted with the curve built so far, the ones after it with zero
+    rates interpolated towards the unknown node, which is solved by Newton steps.
+    Bonds maturing at an already known node are skipped.
+
+    Parameters:
+    - df: Bonds, see ytm_bonds.read_bonds.
+    - max_iterations: Maximal number of Newton steps per bond.
+
+    Returns:
+    - Curve with nodes at the maturities of the bonds.
+    """
+    times, amounts, target = cash_flow_matrix(df)
+    order = np.argsort(times[:, 0], kind="stable")
+
+    node_times, node_rates = list(), list()
+    for bond in order:
+        mask = amounts[bond] != 0
+        t, cash_flow, maturity = times[bond][mask], amounts[bond][mask], times[bond][0]
+        if node_times and maturity <= node_times[-1] + 1e-9:
+            continue
+
+        last_time = node_times[-1] if node_times else 0.0
+        known = t <= last_time
+        known_value = (cash_flow[known] * np.exp(-np.interp(t[known], node_times, node_rates) * t[known])).sum() \
+            if known.any() else 0.0
+        t_new, cash_flow_new = t[~known], cash_flow[~known]
+
+        # zero rate of a new flow is z_last + weight * (z - z_last), flat before the first node
+        last_rate = node_rates[-1] if node_rates else 0.0
+        weight = (t_new - last_time) / (maturity - last_time) if node_times else np.ones_like(t_new)
+        rate = last_rate
+        for _ in range(max_iterations):
+            zero = last_rate + weight * (rate - last_rate)
+            discounted = cash_flow_new * np.exp(-zero * t_new)
+            error = known_value + discounted.sum() - target[bond]
+            if abs(error) < 1e-10 * target[bond]:
+                break
+            rate -= error / (-(discounted * t_new * weight).sum())
+
+        node_times.append(maturity)
+        node_rates.append(rate)
+
+    return BootstrapCurve(np.array(node_times), np.array(node_rates))
+
+
+def plot_curves(df: pd.DataFrame, curves: dict, save_path: Optional[str] = None):
+    maturity = df["years_to_maturity"].to_numpy(dtype=np.float64)
+    grid = np.linspace(max(maturity.min() / 2, 0.05), maturity.max(), 200)
+
+    ytm = calculate_ytm_batch(*(df[column].to_numpy() for column in
+                                ["face_value", "price", "coupon_rate", "years_to_maturity", "accrued_interest",
+                                 "payments_per_year"])).ytm
+    plt.scatter(maturity, continuous_rate(ytm, df["payments_per_year"].to_numpy(dtype=np.float64)), color="black",
+                label="YTM (continuous)")
+    for name, curve in curves.items():
+        plt.plot(grid, curve.zero_rate(grid), label=name)
+    plt.xlabel("Years to maturity")
+    plt.ylabel("Zero rate")
+    plt.title("Yield curve")
+    plt.grid()
+    plt.legend()
+    if save_path:
+        plt.savefig(save_path)
+        print(f"Saved plot to {save_path}")
+    else:
+        plt.show()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a zero curve from bond quotes.")
+    parser.add_argument("--csv", type=str, required=True,
+                        help="CSV file with bonds (columns face_value, price, coupon_rate, years_to_maturity, "
+                             "optionally accrued_interest, payments_per_year)")
+    parser.add_argument("-m", "--method", type=str, choices=["nelson-siegel", "bootstrap", "both"], default="both",
+                        help="Curve construction method")
+    parser.add_argument("-o", "--output", type=str, default=None, help="CSV file for zero rates on a yearly grid")
+    parser.add_argument("--plot", type=str, default=None, help="Save the plot to this file instead of showing it")
+    parser.add_argument("--no-plot", action="store_true", help="Do not plot the curves")
+
+    args = parser.parse_args()
+
+    bonds = read_bonds(args.csv)
+    times, amounts, target = cash_flow_matrix(bonds)
+
+    curves = dict()
+    if args.method in ("nelson-siegel", "both"):
+        curves["nelson-siegel"] = fit_nelson_siegel(bonds)
+        print(f"Nelson-Siegel: {curves['nelson-siegel']}")
+    if args.method in ("bootstrap", "both"):
+        curves["bootstrap"] = bootstrap(bonds)
+
+    for name, curve in curves.items():
+        errors = (curve_prices(curve, times, amounts) / target - 1) * 1e4
+        print(f"{name} price errors (bp): max {np.max(np.abs(errors)):.2f}, mean {np.mean(np.abs(errors)):.2f}")
+
+    if args.output:
+        grid = np.arange(1, int(np.ceil(bonds["years_to_maturity"].max())) + 1)
+        pd.DataFrame({"years": grid, **{name: curve.zero_rate(grid) for name, curve in curves.items()}}).to_csv(
+            args.output, index=False)
+        print(f"Saved zero rates to {args.output}")
+
+    if not args.no_plot:
+        plot_curves(bonds, curves, args.plot)
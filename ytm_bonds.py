@@ -1,4 +1,10 @@
 import argparse
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+BOND_COLUMNS = ["face_value", "price", "coupon_rate", "years_to_maturity", "accrued_interest", "payments_per_year"]
 
 def calculate_ytm(face_value: float, price: float, coupon_rate: float, years_to_maturity: int, accrued_interest:
 float, payments_per_year: int = 1):
@@ -51,6 +57,253 @@ float, payments_per_year: int = 1):
 
     raise ValueError("YTM calculation did not converge")
 
+@dataclass
+class BatchYTM:
+    ytm: np.ndarray
+    converged: np.ndarray
+    iterations: np.ndarray
+    method: np.ndarray
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame({"ytm": np.ravel(self.ytm), "converged": np.ravel(self.converged),
+                             "iterations": np.ravel(self.iterations), "method": np.ravel(self.method)})
+
+
+def payment_schedule(years_to_maturity, payments_per_year):
+    """
+    Coupon schedule of bonds counted back from maturity, shared by the yield and the yield curve calculations.
+    The last payment is at maturity and the previous ones a period apart, so when the maturity is not a whole number
+    of periods the first payment comes after a shorter (stub) period.
+
+    Parameters:
+    - years_to_maturity: The numbers of years until the bonds mature (may be fractional).
+    - payments_per_year: The numbers of coupon payments per year.
+
+    Returns:
+    - total_payments: Numbers of remaining coupon payments.
+    - stub: Elapsed part of the current coupon period (0 for whole periods), payment k (from 1) is due after k - stub
+      periods.
+    """
+    periods = np.asarray(years_to_maturity, dtype=np.float64) * payments_per_year
+    total_payments = np.ceil(periods - 1e-9)
+    return total_payments, np.maximum(total_payments - periods, 0.0)
+
+
+def annuity_price(ytm: np.ndarray, coupon_payment: np.ndarray, face_value: np.ndarray, total_payments: np.ndarray,
+                  payments_per_year: np.ndarray, stub=0.0):
+    """
+    Closed form price of the bond and its derivative with respect to the annual yield, for arrays of bonds.
+
+    Parameters:
+    - ytm: Annual yields (as decimals).
+    - coupon_payment: Periodic coupon payments.
+    - face_value: Face values paid at maturity.
+    - total_payments: Numbers of remaining coupon payments.
+    - payments_per_year: Numbers of coupon payments per year.
+    - stub: Elapsed parts of the current coupon periods, see payment_schedule.
+
+    Returns:
+    - price: Present values of the cash flows.
+    - derivative: Derivatives of the prices with respect to ytm.
+    """
+    rate = ytm / payments_per_year
+    discount = (1 + rate) ** -total_payments.astype(np.float64)
+    small = np.abs(rate) < 1e-9
+    safe_rate = np.where(small, 1.0, rate)
+
+    # annuity factor sum_{t=1..N} (1 + r)^-t and its derivative, with their limits for r -> 0
+    annuity = np.where(small, total_payments, (1 - discount) / safe_rate)
+    annuity_derivative = np.where(small, -total_payments * (total_payments + 1) / 2,
+                                  (total_payments * discount / (1 + safe_rate) * safe_rate - (1 - discount))
+                                  / safe_rate ** 2)
+
+    price = coupon_payment * annuity + face_value * discount
+    derivative = (coupon_payment * annuity_derivative - total_payments * face_value * discount / (1 + rate)) \
+        / payments_per_year
+
+    # all payments are stub periods closer than in the whole period schedule
+    growth = (1 + rate) ** stub
+    return growth * price, growth * (derivative + price * stub / (payments_per_year * (1 + rate)))
+
+
+def calculate_ytm_batch(face_value, price, coupon_rate, years_to_maturity, accrued_interest=0.0,
+                        payments_per_year=1, tolerance: float = 1e-6, max_iterations: int = 50) -> BatchYTM:
+    """
+    Calculate the Yield to Maturity (YTM) of many bonds at once.
+    Coupon dates are counted back from maturity, see payment_schedule (calculate_ytm truncates fractional maturities
+    to whole periods instead, both agree for whole periods).
+    All rows take vectorized Newton steps on the closed form price, rows which do not converge are solved by bisection.
+    Rows without a solution get NaN and converged set to False instead of raising.
+
+    Parameters:
+    - face_value: The bonds' face values (arrays or scalars, broadcast together).
+    - price: The current market prices of the bonds as decimal values.
+    - coupon_rate: The annual coupon rates (as decimals).
+    - years_to_maturity: The numbers of years until the bonds mature.
+    - accrued_interest: The accrued interest since the last coupon payments.
+    - payments_per_year: The numbers of coupon payments per year.
+    - tolerance: Accepted absolute difference between the calculated and the market price.
+    - max_iterations: Maximal number of Newton iterations.
+
+    Returns:
+    - BatchYTM of the broadcast shape of the inputs with annual yields (as decimals), convergence flags, iterations and the method used per row.
+    """
+    inputs = np.broadcast_arrays(*[np.asarray(value, dtype=np.float64) for value in
+                                   (face_value, price, coupon_rate, years_to_maturity, accrued_interest,
+                                    payments_per_year)])
+    # rows are solved on flat arrays (scalars included) and reshaped back to the broadcast shape
+    shape = inputs[0].shape
+    face_value, price, coupon_rate, years_to_maturity, accrued_interest, payments_per_year = [
+        value.reshape(-1) for value in inputs]
+
+    target = price * face_value + accrued_interest
+    total_payments, stub = payment_schedule(years_to_maturity, payments_per_year)
+    coupon_payment = coupon_rate * face_value / payments_per_year
+
+    ytm = coupon_rate.copy()
+    converged = np.zeros(ytm.shape, dtype=bool)
+    iterations = np.zeros(ytm.shape, dtype=np.int64)
+    valid = (target > 0) & (face_value > 0) & (total_payments >= 1)
+    active = valid.copy()
+
+    for _ in range(max_iterations):
+        if not active.any():
+            break
+        price_guess, derivative = annuity_price(ytm[active], coupon_payment[active], face_value[active],
+                                                total_payments[active], payments_per_year[active], stub[active])
+        error = price_guess - target[active]
+        done = np.abs(error) < tolerance
+        with np.errstate(divide="ignore", invalid="ignore"):
+            step = np.where(done, 0.0, error / derivative)
+        updated = ytm[active] - step
+
+        # steps leaving the domain (rate <= -100%) or producing NaN are left to bisection
+        invalid = ~np.isfinite(updated) | (updated <= -payments_per_year[active])
+        indices = np.flatnonzero(active)
+        converged[indices[done]] = True
+        iterations[indices[~done]] += 1
+        ytm[indices[~done & ~invalid]] = updated[~done & ~invalid]
+        active[indices[done | invalid]] = False
+
+    method = np.where(converged, "newton", "failed").astype(object)
+    remaining = valid & ~converged
+    if remaining.any():
+        ytm[remaining], converged[remaining] = _bisect_ytm(target[remaining], coupon_payment[remaining],
+                                                           face_value[remaining], total_payments[remaining],
+                                                           payments_per_year[remaining], stub[remaining], tolerance)
+    method[~converged] = "failed"
+    method[remaining & converged] = "bisection"
+    ytm[~converged] = np.nan
+
+    return BatchYTM(ytm.reshape(shape), converged.reshape(shape), iterations.reshape(shape), method.reshape(shape))
+
+
+def _bisect_ytm(target: np.ndarray, coupon_payment: np.ndarray, face_value: np.ndarray, total_payments: np.ndarray,
+                payments_per_year: np.ndarray, stub: np.ndarray, tolerance: float, max_iterations: int = 200):
+    # the price falls with the yield, so a root is bracketed when the target lies between the prices at the bounds
+    low = np.full(target.shape, -0.99) * payments_per_year
+    high = np.full(target.shape, 10.0) * payments_per_year
+    price_low = annuity_price(low, coupon_payment, face_value, total_payments, payments_per_year, stub)[0]
+    price_high = annuity_price(high, coupon_payment, face_value, total_payments, payments_per_year, stub)[0]
+    bracketed = (price_low >= target) & (price_high <= target)
+
+    for _ in range(max_iterations):
+        middle = (low + high) / 2
+        price_middle = annuity_price(middle, coupon_payment, face_value, total_payments, payments_per_year, stub)[0]
+        above = price_middle > target
+        low = np.where(above, middle, low)
+        high = np.where(above, high, middle)
+        if np.all(high - low < 1e-12):
+            break
+
+    ytm = (low + high) / 2
+    price = annuity_price(ytm, coupon_payment, face_value, total_payments, payments_per_year, stub)[0]
+    return ytm, bracketed & (np.abs(price - target) < tolerance)
+
+
+@dataclass
+class BondRisk:
+    ytm: np.ndarray
+    converged: np.ndarray
+    model_price: np.ndarray
+    macaulay_duration: np.ndarray
+    modified_duration: np.ndarray
+    convexity: np.ndarray
+    dv01: np.ndarray
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame({name: np.ravel(value) for name, value in vars(self).items()})
+
+
+def calculate_risk_batch(face_value, price, coupon_rate, years_to_maturity, accrued_interest=0.0,
+                         payments_per_year=1) -> BondRisk:
+    """
+    Calculate YTM, duration, convexity and DV01 of many bonds at once.
+    Yields are solved by calculate_ytm_batch, the risk measures share one matrix of discount factors
+    (bonds x coupon periods, padded to the longest bond).
+
+    Parameters:
+    - face_value, price, coupon_rate, years_to_maturity, accrued_interest, payments_per_year: See calculate_ytm_batch.
+
+    Returns:
+    - BondRisk with the annual yields, the (dirty) prices at these yields, Macaulay and modified durations (in years),
+      convexities (in years squared) and DV01 (price change for a 1 basis point change of the yield).
+      Rows which did not converge are NaN.
+    """
+    face_value, price, coupon_rate, years_to_maturity, accrued_interest, payments_per_year = np.broadcast_arrays(
+        *[np.asarray(value, dtype=np.float64) for value in
+          (face_value, price, coupon_rate, years_to_maturity, accrued_interest, payments_per_year)])
+    result = calculate_ytm_batch(face_value, price, coupon_rate, years_to_maturity, accrued_interest,
+                                 payments_per_year)
+
+    total_payments, stub = payment_schedule(years_to_maturity, payments_per_year)
+    periods = np.arange(1, int(np.nanmax(total_payments, initial=0)) + 1, dtype=np.float64)
+    paid = periods <= total_payments[..., None]
+
+    cash_flows = np.where(paid, (coupon_rate * face_value / payments_per_year)[..., None], 0.0)
+    cash_flows = cash_flows + np.where(periods == total_payments[..., None], face_value[..., None], 0.0)
+
+    # periods until the payments, shortened by the stub
+    periods = periods - stub[..., None]
+    rate = (result.ytm / payments_per_year)[..., None]
+    discount = (1 + rate) ** -periods
+    present_values = cash_flows * discount
+    model_price = present_values.sum(axis=-1)
+
+    times = periods / payments_per_year[..., None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        macaulay = (times * present_values).sum(axis=-1) / model_price
+        modified = macaulay / (1 + rate[..., 0])
+        convexity = (present_values * periods * (periods + 1)).sum(axis=-1) \
+            / (model_price * (1 + rate[..., 0]) ** 2 * payments_per_year ** 2)
+    dv01 = modified * model_price * 1e-4
+
+    return BondRisk(result.ytm, result.converged, model_price, macaulay, modified, convexity, dv01)
+
+
+def read_bonds(path: str) -> pd.DataFrame:
+    """
+    Reads a CSV file with columns face_value, price, coupon_rate, years_to_maturity and optionally
+    accrued_interest (default 0) and payments_per_year (default 1).
+    """
+    df = pd.read_csv(path)
+    df = df.assign(**{column: df.get(column, default) for column, default in
+                      (("accrued_interest", 0.0), ("payments_per_year", 1))})
+    missing = set(BOND_COLUMNS) - set(df.columns)
+    if missing:
+        raise ValueError(f"Missing columns {sorted(missing)} in {path}")
+    return df
+
+
+def calculate_ytm_frame(df: pd.DataFrame, risk: bool = False) -> pd.DataFrame:
+    """
+    Adds the columns of BatchYTM (or BondRisk if risk is True) to a frame of bonds, see read_bonds.
+    """
+    calculate = calculate_risk_batch if risk else calculate_ytm_batch
+    result = calculate(*(df[column].to_numpy() for column in BOND_COLUMNS))
+    return pd.concat([df.reset_index(drop=True), result.to_frame()], axis=1)
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Calculate Yield to Maturity (YTM) of a bond.")
     parser.add_argument("-fv", "--face-value", type=float, help="Bond face value")
@@ -59,12 +312,28 @@ if __name__ == "__main__":
     parser.add_argument("-ytm", "--years_to_maturity", type=int, help="Years to maturity")
     parser.add_argument("-ai", "--accrued_interest", type=float, default=0, help="Accrued interest since last coupon payment")
     parser.add_argument("-ppr", "--payments_per_year", type=int, default=1, help="Number of coupon payments per year")
+    parser.add_argument("--csv", type=str, default=None,
+                        help="CSV file with many bonds (columns face_value, price, coupon_rate, years_to_maturity, "
+                             "optionally accrued_interest, payments_per_year)")
+    parser.add_argument("-o", "--output", type=str, default=None, help="CSV file for the results of --csv")
+    parser.add_argument("--risk", action="store_true",
+                        help="With --csv, report duration, convexity and DV01 along with the YTM")
 
     args = parser.parse_args()
 
-    ytm = calculate_ytm(args.face_value, args.price, args.coupon_rate, args.years_to_maturity,
-                        args.accrued_interest,  args.payments_per_year)
-    print(f"Yield to Maturity (YTM): {ytm:.4%}")
+    if args.csv:
+        results = calculate_ytm_frame(read_bonds(args.csv), args.risk)
+        if args.output:
+            results.to_csv(args.output, index=False)
+            print(f"Saved results to {args.output}")
+        else:
+            print(results.to_string(index=False))
+        if not results["converged"].all():
+            print(f"{(~results['converged']).sum()} bonds did not converge")
+    else:
+        ytm = calculate_ytm(args.face_value, args.price, args.coupon_rate, args.years_to_maturity,
+                            args.accrued_interest,  args.payments_per_year)
+        print(f"Yield to Maturity (YTM): {ytm:.4%}")
 
 
 # Example parameters: